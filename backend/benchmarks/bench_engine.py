@@ -0,0 +1,297 @@
+"""
+Microbenchmarks of the engine hot paths, the Grid utilities,
+serialization and the event dispatch, on the positions of `benchmarks.fixtures`.
+`notify_listeners[...]` compares the dispatch with and without the `EventStats` hook.
+
+Results are written as JSON and can be compared against a saved baseline.
+
+Run from `backend/`:
+    python -m benchmarks.bench_engine --output baseline.json
+    python -m benchmarks.bench_engine --baseline baseline.json --threshold 0.1
+    python -m benchmarks.bench_engine --filter place_chip
+"""
+from typing import *
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks.fixtures import positions, fresh
+from benchmarks.bench_startup import config_dir
+
+from utils import Grid
+
+
+class Benchmark:
+    """
+    `func(state)` is timed, `setup()` creates the state for one call
+    and is not timed. Without `per_call_setup` the state is created
+    once and `func` is called `number` times in a row
+    """
+    def __init__(
+        self,
+        name: str,
+        func: Callable[[Any], Any],
+        setup: Callable[[], Any] = lambda: None,
+        per_call_setup: bool = False,
+    ):
+        self.name = name
+        self.func = func
+        self.setup = setup
+        self.per_call_setup = per_call_setup
+
+    def run(self, number: int, repeat: int) -> List[float]:
+        """Returns the seconds per call of every repetition"""
+        timings: List[float] = []
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for _ in range(repeat):
+                if self.per_call_setup:
+                    total = 0
+                    for _ in range(number):
+                        state = self.setup()
+                        start = time.perf_counter_ns()
+                        self.func(state)
+                        total += time.perf_counter_ns() - start
+                else:
+                    state = self.setup()
+                    func = self.func
+                    start = time.perf_counter_ns()
+                    for _ in range(number):
+                        func(state)
+                    total = time.perf_counter_ns() - start
+                timings.append(total / number / 1e9)
+        finally:
+            if gc_enabled:
+                gc.enable()
+        return timings
+
+
+class FakeWebSocket:
+    """collects what would be sent to the client"""
+    def __init__(self, id: int):
+        self._id = id
+        self._custom_id = None
+        self._session = None
+        self._user = None
+        self.sent: List[Any] = []
+
+    def write_message(self, message: Any) -> None:
+        self.sent.append(message)
+
+
+def _first_valid_move(name: str) -> Tuple[int, int, int]:
+    game = positions()[name]
+    move = game.get_valid_moves(game.current_player)[0]
+    return move.row, move.column, game.current_player
+
+
+def dispatch_benchmarks() -> List[Benchmark]:
+    """`ReversiEventHandler.dispatch` of a ChipPlacedEvent with two fake websockets"""
+    from impl.event_handler import ReversiEventHandler
+    from impl.reversi.game_manager import ReversiManager
+    from impl.session_manager import GameSessionManager
+
+    session = "BNCH"
+    players = [FakeWebSocket(1), FakeWebSocket(2)]
+    GameSessionManager.sessions[session] = list(players)
+    handler = ReversiEventHandler(players[0])
+    loop = asyncio.new_event_loop()
+    benchmarks = []
+
+    for name in ("midgame", "endgame"):
+        row, column, player = _first_valid_move(name)
+        valid = json.dumps({
+            "event": "ChipPlacedEvent",
+            "session": session,
+            "user_id": player,
+            "data": {"row": row, "column": column},
+        })
+        # the other player is not on turn -> RuleError path
+        invalid = json.dumps({
+            "event": "ChipPlacedEvent",
+            "session": session,
+            "user_id": 3 - player,
+            "data": {"row": row, "column": column},
+        })
+
+        def setup(name: str = name) -> None:
+            ReversiManager._games[session] = fresh(name)
+            for ws in players:
+                ws.sent.clear()
+
+        benchmarks.append(Benchmark(
+            f"dispatch_chip_placed[{name}]",
+            lambda _, message=valid: loop.run_until_complete(handler.dispatch(message)),
+            setup,
+            per_call_setup=True,
+        ))
+        benchmarks.append(Benchmark(
+            f"dispatch_rule_error[{name}]",
+            lambda _, message=invalid: loop.run_until_complete(handler.dispatch(message)),
+            setup,
+        ))
+    return benchmarks
+
+
+def _run_to_end(coro: Coroutine[Any, Any, Any]) -> None:
+    """runs a coroutine which never suspends - without the overhead of an event loop"""
+    try:
+        coro.send(None)
+    except StopIteration:
+        return
+    raise RuntimeError("the coroutine suspended")
+
+
+def notify_benchmarks() -> List[Benchmark]:
+    """`EventManager.notify_listeners` with a listener which does nothing, with and without metrics"""
+    from impl.event_handler import EventManager, ResponseType, ReversiEventHandler
+    from impl.event_metrics import EventMetrics
+    from impl.session_manager import GameSessionManager
+
+    async def listener(event: Dict[str, Any]) -> Tuple[Dict[str, Any], ResponseType]:
+        return {"event": "BenchEvent", "status": 200}, ResponseType.PLAYER
+
+    event = {"event": "BenchEvent", "session": "BNCH"}
+    benchmarks = []
+    for name, metrics in (("plain", None), ("instrumented", EventMetrics())):
+        ws = FakeWebSocket(1)
+        manager = EventManager(ReversiEventHandler(ws), GameSessionManager)
+        manager.metrics = metrics
+        manager.add_listener("BenchEvent", listener)
+
+        def setup(ws: FakeWebSocket = ws) -> None:
+            ws.sent.clear()
+
+        benchmarks.append(Benchmark(
+            f"notify_listeners[{name}]",
+            lambda _, manager=manager: _run_to_end(manager.notify_listeners("BenchEvent", event, 40)),
+            setup,
+        ))
+    return benchmarks
+
+
+def engine_benchmarks() -> List[Benchmark]:
+    benchmarks: List[Benchmark] = []
+    for name, game in positions().items():
+        board = game.board
+        player = game.current_player
+        moves = game.get_valid_moves(player)
+        move = moves[0]
+        benchmarks += [
+            Benchmark(
+                f"theoretically_drop_chip[{name}]",
+                lambda _, board=board, move=move, player=player: board.theoretically_drop_chip(move, player),
+            ),
+            Benchmark(
+                f"get_valid_moves[{name}]",
+                lambda _, game=game, player=player: game.get_valid_moves(player),
+            ),
+            Benchmark(
+                f"place_chip[{name}]",
+                lambda game, move=move, player=player: game.place_chip(move.row, move.column, player),
+                lambda name=name: fresh(name),
+                per_call_setup=True,
+            ),
+            Benchmark(
+                f"board_to_json[{name}]",
+                lambda _, board=board: board.to_json(),
+            ),
+        ]
+    grid = positions()["midgame"].board.board
+    benchmarks += [
+        Benchmark("grid_forward_diagonals", lambda _: Grid.get_forward_diagonals(grid)),
+        Benchmark("grid_backward_diagonals", lambda _: Grid.get_backward_diagonals(grid)),
+        Benchmark("grid_rows", lambda _: Grid.get_rows(grid)),
+        Benchmark("grid_cols", lambda _: Grid.get_cols(grid)),
+    ]
+    return benchmarks
+
+
+def metadata() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "python": sys.version.split()[0],
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> bool:
+    """prints the change of every benchmark and returns whether one regressed by more than `threshold`"""
+    regressed = False
+    print(f"\ncompared to {baseline['meta'].get('commit')} ({baseline['meta'].get('timestamp')}):")
+    for name, result in results["results"].items():
+        old = baseline["results"].get(name)
+        if old is None:
+            print(f"  {name:<44} new")
+            continue
+        change = result["min_us"] / old["min_us"] - 1
+        mark = ""
+        if change > threshold:
+            mark = "  REGRESSION"
+            regressed = True
+        elif change < -threshold:
+            mark = "  faster"
+        print(f"  {name:<44} {old['min_us']:>10.2f} -> {result['min_us']:>10.2f} us ({change:+.1%}){mark}")
+    return regressed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=200, help="calls per repetition")
+    parser.add_argument("--repeat", type=int, default=5, help="repetitions, the fastest one counts")
+    parser.add_argument("--filter", default=None, help="only run benchmarks containing this string")
+    parser.add_argument("--output", default=None, help="write the results as JSON to this file")
+    parser.add_argument("--baseline", default=None, help="JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative slowdown which counts as regression")
+    args = parser.parse_args()
+    output = os.path.abspath(args.output) if args.output else None
+    baseline = os.path.abspath(args.baseline) if args.baseline else None
+
+    # the event handler reads config.yaml from the working directory
+    os.chdir(config_dir())
+    benchmarks = engine_benchmarks() + dispatch_benchmarks() + notify_benchmarks()
+    if args.filter:
+        benchmarks = [b for b in benchmarks if args.filter in b.name]
+
+    results: Dict[str, Any] = {"meta": metadata(), "results": {}}
+    print(f"{'benchmark':<46}{'min us':>10}{'median us':>12}")
+    for benchmark in benchmarks:
+        timings = benchmark.run(args.number, args.repeat)
+        result = {
+            "min_us": min(timings) * 1e6,
+            "median_us": statistics.median(timings) * 1e6,
+            "number": args.number,
+            "repeat": args.repeat,
+        }
+        results["results"][benchmark.name] = result
+        print(f"{benchmark.name:<46}{result['min_us']:>10.2f}{result['median_us']:>12.2f}")
+
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    regressed = False
+    if baseline:
+        with open(baseline, "r", encoding="utf-8") as f:
+            regressed = compare(results, json.load(f), args.threshold)
+    sys.exit(1 if regressed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Measures the cold import time of `main.py` in fresh interpreters and
+checks it against an import-time budget.
+
+Run from `backend/`:
+    python -m benchmarks.bench_startup --runs 5 --budget-ms 600
+"""
+from typing import *
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# modules which should only be imported on first use
+LAZY_MODULES: Final[Tuple[str, ...]] = ("pandas", "numpy", "aiofiles")
+
+_IMPORT_SCRIPT = """
+import sys, time
+start = time.perf_counter()
+import main
+elapsed = time.perf_counter() - start
+print("elapsed", elapsed)
+print("loaded", ",".join(m for m in {lazy!r} if m in sys.modules))
+"""
+
+
+def config_dir() -> str:
+    """the directory with `config.yaml` - main.py reads it from the working directory"""
+    for directory in (BACKEND_DIR, os.path.dirname(BACKEND_DIR)):
+        if os.path.exists(os.path.join(directory, "config.yaml")):
+            return directory
+    raise FileNotFoundError("no config.yaml found next to backend/")
+
+
+def run_once(cwd: str, importtime: bool = False) -> Tuple[float, List[str], str]:
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [BACKEND_DIR, os.environ.get("PYTHONPATH")]))}
+    command = [sys.executable, "-B"]
+    if importtime:
+        command += ["-X", "importtime"]
+    command += ["-c", _IMPORT_SCRIPT.format(lazy=LAZY_MODULES)]
+    result = subprocess.run(command, cwd=cwd, env=env, capture_output=True, text=True, check=True)
+    elapsed = float(re.search(r"elapsed (\S+)", result.stdout).group(1))
+    loaded = [m for m in re.search(r"loaded (.*)", result.stdout).group(1).split(",") if m]
+    return elapsed, loaded, result.stderr
+
+
+def slowest_imports(importtime_output: str, top: int) -> List[Tuple[int, str]]:
+    """the modules with the highest cumulative import time in µs"""
+    rows: List[Tuple[int, str]] = []
+    for line in importtime_output.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \|(\s*)(\S+)", line)
+        if match:
+            rows.append((int(match.group(1)), match.group(3)))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=600.0, help="fail if the median is above")
+    parser.add_argument("--top", type=int, default=10, help="amount of slowest imports to show")
+    args = parser.parse_args()
+
+    cwd = config_dir()
+    timings = []
+    loaded: List[str] = []
+    for _ in range(args.runs):
+        elapsed, loaded, _ = run_once(cwd)
+        timings.append(elapsed * 1000)
+    _, _, importtime_output = run_once(cwd, importtime=True)
+
+    median = statistics.median(timings)
+    print(f"import main: median {median:.1f} ms, min {min(timings):.1f} ms, max {max(timings):.1f} ms ({args.runs} runs)")
+    print(f"slowest imports (cumulative):")
+    for micro_seconds, module in slowest_imports(importtime_output, args.top):
+        print(f"  {micro_seconds / 1000:>8.1f} ms  {module}")
+    failed = False
+    if loaded:
+        print(f"FAIL: lazily loaded modules imported at startup: {', '.join(loaded)}")
+        failed = True
+    if median > args.budget_ms:
+        print(f"FAIL: median import time {median:.1f} ms exceeds the budget of {args.budget_ms:.0f} ms")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
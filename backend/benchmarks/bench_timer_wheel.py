@@ -0,0 +1,156 @@
+"""
+Measures the game clocks of `TimerWheel` against one asyncio timer or task per game:
+cost of schedule / reschedule (one per move) / cancel, the cost of a tick
+with many live timers and the memory per timer.
+
+Run from `backend/`:
+    python -m benchmarks.bench_timer_wheel --timers 100000
+"""
+from typing import *
+import argparse
+import asyncio
+import gc
+import random
+import time
+import tracemalloc
+
+from core.timer_wheel import TimerWheel
+
+
+def _noop(*args: Any) -> None:
+    pass
+
+
+def _per_op(start: int, count: int) -> float:
+    """ns per operation"""
+    return (time.perf_counter_ns() - start) / count
+
+
+def bench_wheel(count: int, delays: List[float]) -> Dict[str, float]:
+    wheel = TimerWheel(tick=0.1)
+    start = time.perf_counter_ns()
+    timers = [wheel.schedule(delay, _noop) for delay in delays]
+    schedule = _per_op(start, count)
+
+    start = time.perf_counter_ns()
+    for timer, delay in zip(timers, reversed(delays)):
+        wheel.reschedule(timer, delay)
+    reschedule = _per_op(start, count)
+
+    ticks = 600
+    start = time.perf_counter_ns()
+    wheel.advance(ticks)
+    tick = _per_op(start, ticks)
+
+    start = time.perf_counter_ns()
+    for timer in timers:
+        wheel.cancel(timer)
+    cancel = _per_op(start, count)
+    return {"schedule_ns": schedule, "reschedule_ns": reschedule, "cancel_ns": cancel, "tick_ns": tick}
+
+
+async def bench_call_later(count: int, delays: List[float]) -> Dict[str, float]:
+    """one `loop.call_later` handle per game, replaced after every move"""
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter_ns()
+    handles = [loop.call_later(delay, _noop) for delay in delays]
+    schedule = _per_op(start, count)
+
+    start = time.perf_counter_ns()
+    for i, delay in enumerate(reversed(delays)):
+        handles[i].cancel()
+        handles[i] = loop.call_later(delay, _noop)
+    reschedule = _per_op(start, count)
+
+    start = time.perf_counter_ns()
+    for handle in handles:
+        handle.cancel()
+    cancel = _per_op(start, count)
+    # cancelled handles stay in the heap until the loop pops them
+    start = time.perf_counter_ns()
+    await asyncio.sleep(0)
+    tick = time.perf_counter_ns() - start
+    return {"schedule_ns": schedule, "reschedule_ns": reschedule, "cancel_ns": cancel, "tick_ns": tick}
+
+
+async def bench_tasks(count: int, delays: List[float]) -> Dict[str, float]:
+    """one sleeping task per game, cancelled and recreated after every move"""
+    start = time.perf_counter_ns()
+    tasks = [asyncio.ensure_future(asyncio.sleep(delay)) for delay in delays]
+    await asyncio.sleep(0)
+    schedule = _per_op(start, count)
+
+    start = time.perf_counter_ns()
+    for i, delay in enumerate(reversed(delays)):
+        tasks[i].cancel()
+        tasks[i] = asyncio.ensure_future(asyncio.sleep(delay))
+    await asyncio.sleep(0)
+    reschedule = _per_op(start, count)
+
+    start = time.perf_counter_ns()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    cancel = _per_op(start, count)
+    return {"schedule_ns": schedule, "reschedule_ns": reschedule, "cancel_ns": cancel, "tick_ns": float("nan")}
+
+
+def memory_per_timer(count: int, delays: List[float], kind: str) -> float:
+    """bytes allocated per live timer"""
+    async def allocate() -> Any:
+        loop = asyncio.get_running_loop()
+        if kind == "wheel":
+            wheel = TimerWheel(tick=0.1)
+            return wheel, [wheel.schedule(delay, _noop) for delay in delays]
+        if kind == "call_later":
+            return [loop.call_later(delay, _noop) for delay in delays]
+        tasks = [asyncio.ensure_future(asyncio.sleep(delay)) for delay in delays]
+        await asyncio.sleep(0)
+        return tasks
+
+    async def measure() -> float:
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        kept = await allocate()
+        after = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        if kind == "tasks":
+            for task in kept:
+                task.cancel()
+            await asyncio.gather(*kept, return_exceptions=True)
+        return (after - before) / count
+
+    return asyncio.run(measure())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--timers", type=int, default=100_000, help="concurrent games")
+    parser.add_argument("--min-delay", type=float, default=10.0)
+    parser.add_argument("--max-delay", type=float, default=600.0)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    delays = [rng.uniform(args.min_delay, args.max_delay) for _ in range(args.timers)]
+    gc.disable()
+    results = {
+        "wheel": bench_wheel(args.timers, delays),
+        "call_later": asyncio.run(bench_call_later(args.timers, delays)),
+        "tasks": asyncio.run(bench_tasks(args.timers, delays)),
+    }
+    gc.enable()
+    for kind in results:
+        results[kind]["bytes_per_timer"] = memory_per_timer(args.timers, delays, kind)
+
+    print(f"{args.timers} timers between {args.min_delay}s and {args.max_delay}s")
+    print(f"{'':<12}{'schedule ns':>14}{'reschedule ns':>16}{'cancel ns':>12}{'tick us':>10}{'bytes/timer':>14}")
+    for kind, values in results.items():
+        print(
+            f"{kind:<12}{values['schedule_ns']:>14.0f}{values['reschedule_ns']:>16.0f}{values['cancel_ns']:>12.0f}"
+            f"{values['tick_ns'] / 1000:>10.1f}{values['bytes_per_timer']:>14.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
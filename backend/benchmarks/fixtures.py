@@ -0,0 +1,70 @@
+"""
+Reproducible game positions for the benchmarks.
+
+A position is a start pattern plus a number of random valid moves
+chosen by a seeded `random.Random`. The global `random` state is only
+used while the `Game` is created and restored afterwards.
+"""
+from typing import *
+import copy
+import random
+
+from impl.reversi.game import Game, Board, StartPattern
+
+__all__: Final[Sequence[str]] = ["POSITIONS", "make_position", "positions", "fresh"]
+
+PLAYER_1: Final[int] = 1
+PLAYER_2: Final[int] = 2
+
+# name -> (start pattern, amount of moves played, seed)
+POSITIONS: Final[Dict[str, Tuple[str, int, int]]] = {
+    "start": ("DIAGONAL", 0, 1),
+    "midgame": ("DIAGONAL", 28, 1),
+    "endgame": ("DIAGONAL", 52, 1),
+    "midgame_horizontal": ("HORIZONTAL", 28, 2),
+}
+
+
+def make_position(pattern: str = "DIAGONAL", moves: int = 0, seed: int = 0) -> Game:
+    """
+    Returns:
+    --------
+    `Game`
+        a game with `moves` random valid moves played on the `pattern` start board.
+        If the game ends earlier, the next seed is tried
+    """
+    for attempt in range(100):
+        state = random.getstate()
+        random.seed(seed + attempt)
+        try:
+            game = Game(PLAYER_1, PLAYER_2)
+            Board._generate_board(game, 8, 8, start_pattern=getattr(StartPattern, pattern))
+        finally:
+            random.setstate(state)
+        rng = random.Random(seed + attempt)
+        for _ in range(moves):
+            valid_moves = game.get_valid_moves(game.current_player)
+            if not valid_moves or game.game_over:
+                break
+            move = rng.choice(valid_moves)
+            game.place_chip(move.row, move.column, game.current_player)
+        else:
+            if not game.game_over and game.get_valid_moves(game.current_player):
+                return game
+    raise RuntimeError(f"no position with {moves} moves found for seed {seed}")
+
+
+_cache: Dict[str, Game] = {}
+
+
+def positions() -> Dict[str, Game]:
+    """every position of `POSITIONS`. Copy them with `copy.deepcopy` before mutating"""
+    if not _cache:
+        for name, (pattern, moves, seed) in POSITIONS.items():
+            _cache[name] = make_position(pattern, moves, seed)
+    return _cache
+
+
+def fresh(name: str) -> Game:
+    """a copy of the position `name` which may be mutated"""
+    return copy.deepcopy(positions()[name])
@@ -1,3 +1,8 @@
 from .singleton import Singleton
 from .config import *
-from .db import Database, Table, get_config
\ No newline at end of file
+from .metrics import Metrics
+from .db import Database, Table, get_config
+from .errors import ServiceOverloaded
+from .hashing import PasswordHasher
+from .tokens import TokenSigner
+from .loop_monitor import LoopMonitor
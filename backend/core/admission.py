@@ -0,0 +1,146 @@
+"""Admission control for the database pool"""
+from typing import *
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+import logging
+import time
+
+from .errors import ServiceOverloaded
+from .metrics import RollingHistogram
+
+__all__: Final[Sequence[str]] = ["AdmissionController", "DatabaseOverloaded"]
+
+
+class DatabaseOverloaded(ServiceOverloaded):
+    """raised when the database can't take more work"""
+
+
+class AdmissionController:
+    """
+    Limits how many database operations run at the same time (`limit`)
+    and how many may wait for a slot (`max_waiting`). Everything beyond
+    that fails fast with `DatabaseOverloaded` instead of queueing without limit.
+
+    The limit can be adapted between `min_limit` and `max_limit` with `adapt`.
+    """
+    def __init__(
+        self,
+        min_limit: int,
+        max_limit: int,
+        max_waiting: int,
+        timeout: float,
+        target_wait: float = 0.05,
+    ):
+        self.log = logging.getLogger(self.__class__.__name__)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = max_limit
+        self.max_waiting = max_waiting
+        self.timeout = timeout
+        self.target_wait = target_wait
+        self.in_flight = 0
+        self.rejected = 0
+        self._peak_in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self.wait_time = RollingHistogram(windows=2, window_seconds=10)
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    @property
+    def saturation(self) -> float:
+        """used slots and waiting operations relative to `limit` - above 1 operations wait"""
+        return (self.in_flight + len(self._waiters)) / self.limit
+
+    @asynccontextmanager
+    async def admit(self) -> AsyncIterator[None]:
+        """
+        Waits for a free slot.
+
+        Raises:
+        -------
+        DatabaseOverloaded:
+            - if `max_waiting` operations are already waiting
+            - if no slot is free after `timeout` seconds
+        """
+        if self.in_flight < self.limit and not self._waiters:
+            self.wait_time.observe(0.0)
+            self.in_flight += 1
+        else:
+            await self._wait()
+        self._peak_in_flight = max(self._peak_in_flight, self.in_flight)
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._wake()
+
+    async def _wait(self) -> None:
+        if len(self._waiters) >= self.max_waiting:
+            self.rejected += 1
+            raise DatabaseOverloaded(f"{len(self._waiters)} database operations waiting")
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.timeout)
+        except asyncio.TimeoutError:
+            self._abandon(waiter)
+            self.rejected += 1
+            raise DatabaseOverloaded(f"no database slot free after {self.timeout}s")
+        except asyncio.CancelledError:
+            self._abandon(waiter)
+            raise
+        finally:
+            self.wait_time.observe(time.perf_counter() - start)
+
+    def _abandon(self, waiter: asyncio.Future) -> None:
+        """removes a waiter which gave up and passes on a slot it may already got"""
+        if waiter.done() and not waiter.cancelled():
+            # the slot was handed over in the meantime
+            self.in_flight -= 1
+            self._wake()
+            return
+        waiter.cancel()
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    def _wake(self) -> None:
+        """hands free slots over to the oldest waiters"""
+        while self._waiters and self.in_flight < self.limit:
+            waiter = self._waiters.popleft()
+            if waiter.done():
+                continue
+            self.in_flight += 1
+            waiter.set_result(None)
+
+    def adapt(self) -> None:
+        """
+        Adjusts `limit` by the wait time of the last seconds.
+        Called periodically when adaptive sizing is enabled:
+            - waits above `target_wait` while all slots are used -> one slot more
+            - barely any wait and less than half of the slots used -> one slot less
+        """
+        wait_p95 = self.wait_time.quantile(0.95)
+        peak, self._peak_in_flight = self._peak_in_flight, self.in_flight
+        if wait_p95 > self.target_wait and peak >= self.limit and self.limit < self.max_limit:
+            self.limit += 1
+            self.log.debug("raised limit to %s (wait p95: %ss)", self.limit, wait_p95)
+            self._wake()
+        elif wait_p95 <= self.target_wait / 4 and peak < self.limit / 2 and self.limit > self.min_limit:
+            self.limit -= 1
+            self.log.debug("lowered limit to %s", self.limit)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "waiting": len(self._waiters),
+            "rejected": self.rejected,
+            "wait_p95": self.wait_time.quantile(0.95),
+            "saturation": self.saturation,
+        }
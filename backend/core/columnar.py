@@ -0,0 +1,155 @@
+"""Builds DataFrames column by column from PostgreSQL's binary COPY format"""
+from typing import *
+
+import numpy as np
+import pandas as pd
+
+__all__: Final[Sequence[str]] = [
+    "FIXED_WIDTH_TYPES",
+    "parse_binary_copy",
+    "records_to_dataframe"
+]
+
+# postgres type name -> big endian numpy dtype of the binary representation
+FIXED_WIDTH_TYPES: Final[Dict[str, str]] = {
+    "bool": "?",
+    "int2": ">i2",
+    "int4": ">i4",
+    "int8": ">i8",
+    "float4": ">f4",
+    "float8": ">f8",
+    "date": ">i4",  # days since 2000-01-01
+    "timestamp": ">i8",  # microseconds since 2000-01-01
+    "timestamptz": ">i8",
+}
+_COPY_SIGNATURE: Final[bytes] = b"PGCOPY\n\xff\r\n\x00"
+_PG_EPOCH_US = np.datetime64("2000-01-01T00:00:00", "us")
+_PG_EPOCH_DAYS = np.datetime64("2000-01-01", "D")
+
+
+def parse_binary_copy(
+    buffer: bytes,
+    columns: Sequence[Tuple[str, str]]
+) -> Dict[str, np.ndarray]:
+    """
+    Parses the output of `COPY ... TO STDOUT (FORMAT binary)` into
+    one NumPy array per column.
+
+    Without NULLs every row has the same size. The rows are then viewed
+    as one structured array (no copy) and every column is copied once
+    into native byte order. Otherwise the rows are walked one by one.
+
+    Args:
+    -----
+    buffer : `bytes`
+        the complete binary COPY output
+    columns : `Sequence[Tuple[str, str]]`
+        (column name, postgres type name) for every column
+
+    Returns:
+    --------
+    `Dict[str, np.ndarray]`
+        the columns. Columns with NULLs are float (NaN), datetime (NaT)
+        or, for bool, object (None) arrays
+
+    Raises:
+    -------
+    ValueError:
+        if the buffer is no binary COPY output or a type is not in `FIXED_WIDTH_TYPES`
+    """
+    if not buffer.startswith(_COPY_SIGNATURE):
+        raise ValueError("buffer is not in binary COPY format")
+    unsupported = [type_name for _, type_name in columns if type_name not in FIXED_WIDTH_TYPES]
+    if unsupported:
+        raise ValueError(f"types without fixed width: {unsupported}")
+    # signature (11) + flags (4) + header extension length (4) + extension
+    extension_length = int.from_bytes(buffer[15:19], "big")
+    # the trailer is a field count of -1
+    body = memoryview(buffer)[19 + extension_length:len(buffer) - 2]
+
+    fields: List[Tuple[str, str]] = [("field_count", ">i2")]
+    for i, (_, type_name) in enumerate(columns):
+        fields.append((f"length_{i}", ">i4"))
+        fields.append((f"value_{i}", FIXED_WIDTH_TYPES[type_name]))
+    row_type = np.dtype(fields)
+    if len(body) % row_type.itemsize != 0:
+        # NULLs have no value bytes, so the rows differ in size
+        return _parse_rows(body, columns)
+    rows = np.frombuffer(body, dtype=row_type)
+    if len(rows) and not (rows["field_count"] == len(columns)).all():
+        return _parse_rows(body, columns)
+    for i in range(len(columns)):
+        if len(rows) and not (rows[f"length_{i}"] == row_type.fields[f"value_{i}"][0].itemsize).all():
+            return _parse_rows(body, columns)
+
+    return {
+        name: _to_native(rows[f"value_{i}"], type_name, None)
+        for i, (name, type_name) in enumerate(columns)
+    }
+
+
+def _parse_rows(body: memoryview, columns: Sequence[Tuple[str, str]]) -> Dict[str, np.ndarray]:
+    """the slow path for data with NULLs - one row at a time"""
+    widths = [np.dtype(FIXED_WIDTH_TYPES[type_name]).itemsize for _, type_name in columns]
+    values = [bytearray() for _ in columns]
+    nulls: List[List[bool]] = [[] for _ in columns]
+    data = bytes(body)
+    position = 0
+    while position < len(data):
+        field_count = int.from_bytes(data[position:position + 2], "big", signed=True)
+        position += 2
+        if field_count != len(columns):
+            raise ValueError(f"row with {field_count} fields, expected {len(columns)}")
+        for i, width in enumerate(widths):
+            length = int.from_bytes(data[position:position + 4], "big", signed=True)
+            position += 4
+            if length == -1:
+                values[i] += bytes(width)
+                nulls[i].append(True)
+                continue
+            if length != width:
+                raise ValueError(f"field of {length} bytes in a column of {width} bytes")
+            values[i] += data[position:position + width]
+            position += width
+            nulls[i].append(False)
+    return {
+        name: _to_native(
+            np.frombuffer(bytes(values[i]), dtype=FIXED_WIDTH_TYPES[type_name]),
+            type_name,
+            np.array(nulls[i], dtype=bool),
+        )
+        for i, (name, type_name) in enumerate(columns)
+    }
+
+
+def _to_native(values: np.ndarray, type_name: str, null: np.ndarray | None) -> np.ndarray:
+    """converts big endian postgres values, NULLs become NaN / NaT / None"""
+    has_nulls = null is not None and bool(null.any())
+    if type_name in ("timestamp", "timestamptz"):
+        array = _PG_EPOCH_US + values.astype("=i8").astype("timedelta64[us]")
+    elif type_name == "date":
+        array = _PG_EPOCH_DAYS + values.astype("=i4").astype("timedelta64[D]")
+    elif not has_nulls:
+        return values.astype(values.dtype.newbyteorder("="))
+    elif type_name == "bool":
+        array = values.astype(object)
+        array[null] = None
+        return array
+    else:
+        array = values.astype(np.float64)
+        array[null] = np.nan
+        return array
+    if has_nulls:
+        array[null] = np.datetime64("NaT")
+    return array
+
+
+def records_to_dataframe(records: Sequence[Sequence[Any]], columns: List[str]) -> pd.DataFrame:
+    """
+    Builds a DataFrame column by column from records.
+    Used when the binary fast path is not possible
+    """
+    return pd.DataFrame(
+        {name: [record[i] for record in records] for i, name in enumerate(columns)},
+        columns=columns,
+    )
@@ -150,6 +150,14 @@ class ConfigType(Enum):
 def get_config():
     return ConfigProxy(ConfigType.YAML, path=f"{os.getcwd()}/config.yaml")
 
+
+def config_section(name: str) -> Dict[str, Any]:
+    """the options of the section `name` of `config.yaml` - empty if it doesn't exist"""
+    try:
+        return getattr(get_config(), name).options
+    except AttributeError:
+        return {}
+
 if __name__ == "__main__":
     config = ConfigProxy(ConfigType.YAML)
     for s in config:
@@ -1,69 +1,196 @@
 import asyncio
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
 import os
 import typing
 from typing import *
-from functools import wraps, update_wrapper
-import traceback
+from functools import wraps, update_wrapper, lru_cache
 from datetime import datetime, timedelta
+import time
 import re
+import io
 from collections import OrderedDict
 import logging
 
-import aiofiles
 import asyncpg
-import pandas as pd
 
-from core import ConfigProxy, ConfigType, Singleton
+from core import ConfigProxy, ConfigType, Singleton, config_section
+from core.metrics import LabeledHistograms, Metrics, RollingHistogram
+from core.admission import AdmissionController, DatabaseOverloaded
+
+if TYPE_CHECKING:
+    # pandas is heavy and only needed for DataFrames - it's imported on first use
+    import pandas as pd
 
-conf = ConfigProxy(ConfigType.YAML, path=f"{os.getcwd()}/config.yaml")
 
 def get_config() -> ConfigProxy:
-    global conf
-    return conf
+    """parses `config.yaml` on first use"""
+    return ConfigProxy(ConfigType.YAML, path=f"{os.getcwd()}/config.yaml")
 
 
 __all__: Final[Sequence[str]] = ["Database"]
 
 log = logging.getLogger(__name__)
-DSN = conf.backend.DSN
 table_logging = False
-log.info(f"DB table DEBUG logging: {table_logging}")
-db_calls: Dict[datetime, int] = {}
-    
+log.info("DB table DEBUG logging: %s", table_logging)
+# amount of generated SQL templates kept per operation
+SQL_TEMPLATE_CACHE_SIZE = 256
+# records fetched per round trip when streaming with a cursor
+STREAM_PREFETCH = 500
+
+
+class DatabaseSettings:
+    """the database options of the `backend` config section"""
+    def __init__(self, section: Any):
+        # checked by `Database.connect` - the rest works without a database
+        self.dsn: str | None = os.environ.get("REVERSI_DSN") or section.get("dsn")
+        # amount of prepared statements asyncpg keeps per pooled connection (LRU)
+        self.statement_cache_size = int(section.get("statement_cache_size", 256))
+        # pool sizing and admission control
+        self.pool_min_size = int(section.get("pool_min_size", 2))
+        self.pool_max_size = int(section.get("pool_max_size", 10))
+        # seconds an operation waits for a connection before it's rejected
+        self.acquire_timeout = float(section.get("acquire_timeout", 2.0))
+        # operations waiting for a connection before new ones are rejected
+        self.max_waiting = int(section.get("max_waiting", 100))
+        # adapt the amount of used connections to the measured wait time
+        self.adaptive_pool = bool(section.get("adaptive_pool", False))
+        self.target_wait = float(section.get("target_wait", 0.05))
+
+
+@lru_cache(maxsize=None)
+def get_settings() -> DatabaseSettings:
+    return DatabaseSettings(config_section("backend"))
+
+
+@lru_cache(maxsize=1024)
+def _template_label(query: str) -> str:
+    """the query on one line, used as metric label"""
+    return " ".join(query.split())
+
+
+class QueryMetrics:
+    """
+    Latency histograms per SQL template and per table, the pool wait time 
+    and error counts - all in fixed-size rolling windows
+    """
+    def __init__(self) -> None:
+        self.templates = LabeledHistograms(
+            "reversi_db_query_seconds", "template", "Query latency per SQL template"
+        )
+        self.tables = LabeledHistograms(
+            "reversi_db_table_query_seconds", "table", "Query latency per table", max_series=64
+        )
+        self.pool_wait = RollingHistogram()
+
+    def record(self, query: str, table: str | None, seconds: float, failed: bool) -> None:
+        template = _template_label(query)
+        self.templates.observe(template, seconds)
+        if failed:
+            self.templates.error(template)
+        if table is not None:
+            self.tables.observe(table, seconds)
+            if failed:
+                self.tables.error(table)
 
-def add_call():
-    now = datetime.now()
-    time = datetime(now.year, now.month, now.day, now.hour, 0, 0)
+    def render(self) -> Iterator[str]:
+        yield from self.templates.render()
+        yield from self.tables.render()
+        yield "# HELP reversi_db_pool_wait_seconds Time waited for a pooled connection"
+        yield "# TYPE reversi_db_pool_wait_seconds histogram"
+        yield from self.pool_wait.render("reversi_db_pool_wait_seconds", {})
+
+
+query_metrics = QueryMetrics()
+Metrics.register("database", query_metrics.render)
+
+# connection bound by `Database.transaction` to the current task
+_bound_cxn: ContextVar[Optional[asyncpg.Connection]] = ContextVar("_bound_cxn", default=None)
+# tables written by the unit of work of the current task - invalidated in
+# `RecordCache` when it commits
+_pending_invalidations: ContextVar[Optional[Set[str]]] = ContextVar("_pending_invalidations", default=None)
+
+
+async def _timed(coro: Awaitable[Any], query: str, table: str | None) -> Any:
+    """awaits `coro` and records its latency in `query_metrics`"""
+    start = time.perf_counter()
+    failed = True
     try:
-        db_calls[time] += 1
-    except KeyError:
-        db_calls[time] = 1
+        result = await coro
+        failed = False
+        return result
+    finally:
+        query_metrics.record(query, table, time.perf_counter() - start, failed)
 
-def acquire(func: Callable[..., Any]) -> Callable[..., Any]:
-    @wraps(func)
-    async def wrapper(self: "Database", *args: Any, **kwargs: Any) -> Any:
-        add_call()
-        if isinstance(self, str):
-            args = (self, *args)
-            self = Database()
-        assert self.is_connected, "Not connected."
-        self.calls += 1
-        cxn: asyncpg.Connection
-        async with self._pool.acquire() as cxn:
-            async with cxn.transaction():
-                return await func(self, *args, _cxn=cxn, **kwargs)
 
-    return wrapper
+def acquire(func: Callable[..., Any] | None = None, *, transaction: bool = True) -> Callable[..., Any]:
+    """
+    Acquires a pooled connection and passes it as `_cxn` to the decorated method.
+
+    Args:
+    -----
+    transaction : `bool`
+        whether the call is wrapped into a transaction by default.
+        Single reads don't need one - a caller can still ask for it
+        with `_transaction=True`.
+
+    NOTE:
+    -----
+        - inside of `Database.transaction()` the bound connection
+          and its transaction are reused
+        - the pool wait and query latency are recorded in `query_metrics`.
+          Pass `_table` to record them for a table as well
+    """
+    def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
+        @wraps(func)
+        async def wrapper(
+            self: "Database", 
+            *args: Any, 
+            _transaction: bool | None = None, 
+            _table: str | None = None,
+            **kwargs: Any
+        ) -> Any:
+            if isinstance(self, str):
+                args = (self, *args)
+                self = Database()
+            assert self.is_connected, "Not connected."
+            self.calls += 1
+            query = args[0] if args and isinstance(args[0], str) else func.__name__
+            cxn: asyncpg.Connection | None = _bound_cxn.get()
+            if cxn is not None:
+                # part of an unit of work
+                return await _timed(func(self, *args, _cxn=cxn, **kwargs), query, _table)
+            if _transaction is None:
+                _transaction = transaction
+            async with self._connection() as cxn:
+                if not _transaction:
+                    return await _timed(func(self, *args, _cxn=cxn, **kwargs), query, _table)
+                async with cxn.transaction():
+                    return await _timed(func(self, *args, _cxn=cxn, **kwargs), query, _table)
+
+        return wrapper
+    if func is None:
+        return decorator
+    return decorator(func)
 
 
 class Database(metaclass=Singleton):
-    __slots__: Sequence[str] = ("_connected", "_pool", "calls", "log")
+    __slots__: Sequence[str] = ("_connected", "_pool", "calls", "log", "admission", "_sizer", "settings")
     instance = None
 
     def __init__(self) -> None:
         self._connected = asyncio.Event()
         self.calls = 0
         self.log = logging.getLogger(self.__class__.__name__)
+        self.settings = get_settings()
+        self.admission = AdmissionController(
+            min_limit=self.settings.pool_min_size,
+            max_limit=self.settings.pool_max_size,
+            max_waiting=self.settings.max_waiting,
+            timeout=self.settings.acquire_timeout,
+            target_wait=self.settings.target_wait,
+        )
+        self._sizer: asyncio.Task | None = None
 
     async def wait_until_connected(self) -> None:
         await self._connected.wait()
@@ -80,10 +207,25 @@ class Database(metaclass=Singleton):
     async def connect(self) -> None:
         return
         assert not self.is_connected, "Already connected."
-        pool: Optional[asyncpg.Pool] = await asyncpg.create_pool(dsn=DSN)
+        if not self.settings.dsn:
+            msg = "No DSN configured - set `backend.DSN` or REVERSI_DSN"
+            self.log.critical(msg)
+            raise RuntimeError(msg)
+        # asyncpg prepares every statement once per connection and keeps it
+        # in a LRU cache. Since `Table` generates stable SQL templates,
+        # repeated calls hit this cache instead of being parsed again.
+        pool: Optional[asyncpg.Pool] = await asyncpg.create_pool(
+            dsn=self.settings.dsn,
+            min_size=self.settings.pool_min_size,
+            max_size=self.settings.pool_max_size,
+            statement_cache_size=self.settings.statement_cache_size,
+            # connections above `min_size` which are not used by the 
+            # admission limit are closed after this time
+            max_inactive_connection_lifetime=60.0,
+        )
         if not isinstance(pool, asyncpg.Pool):
             msg = (
-                f"Requsting a pool from DSN `{DSN}` is not possible. "
+                f"Requsting a pool from DSN `{self.settings.dsn}` is not possible. "
                 f"Try to change DSN"
             )
             self.log.critical(msg)
@@ -92,12 +234,99 @@ class Database(metaclass=Singleton):
             
         self._pool: asyncpg.Pool = pool
         self._connected.set()
+        if self.settings.adaptive_pool:
+            self._sizer = asyncio.create_task(self._adapt_pool())
         self.log.info("Connected/Initialized to database successfully.")
         await self.sync()
         return
 
+    @asynccontextmanager
+    async def transaction(self, **kwargs: Any) -> AsyncIterator[asyncpg.Connection]:
+        """
+        Unit of work. All `Database` and `Table` calls inside of this 
+        block share one connection and one transaction.
+
+        Args:
+        -----
+        **kwargs : `Any`
+            passed to `asyncpg.Connection.transaction` (isolation, readonly, deferrable)
+
+        Example:
+        --------
+        ```py
+        async with Database().transaction():
+            record = await Table("profile.information").insert(values={"username": name})
+            await Table("profile.authentication").insert(values={"user_id": record[0]["id"], ...})
+        ```
+
+        NOTE:
+        -----
+            - nested blocks create a savepoint
+            - tasks created inside of the block inherit the connection;
+              don't run queries of them concurrently
+            - `RecordCache` invalidations of the block are deferred until it commits
+        """
+        assert self.is_connected, "Not connected."
+        cxn: asyncpg.Connection | None = _bound_cxn.get()
+        if cxn is not None:
+            async with cxn.transaction(**kwargs):
+                yield cxn
+            return
+        written: Set[str] = set()
+        async with self._connection() as cxn:
+            async with cxn.transaction(**kwargs):
+                token = _bound_cxn.set(cxn)
+                pending_token = _pending_invalidations.set(written)
+                try:
+                    yield cxn
+                finally:
+                    _pending_invalidations.reset(pending_token)
+                    _bound_cxn.reset(token)
+        # committed - only now other readers can see the writes
+        cache = get_record_cache()
+        for table in written:
+            cache.invalidate(table)
+
+    @asynccontextmanager
+    async def _connection(self) -> AsyncIterator[asyncpg.Connection]:
+        """
+        Acquires a pooled connection after passing the admission control.
+        Both together take at most `acquire_timeout` seconds.
+
+        Raises:
+        -------
+        DatabaseOverloaded:
+            if the database is saturated. Handlers should answer with 503
+        """
+        deadline = time.perf_counter() + self.settings.acquire_timeout
+        async with self.admission.admit():
+            requested = time.perf_counter()
+            try:
+                if requested >= deadline:
+                    raise asyncio.TimeoutError
+                # only the time which is left after the admission
+                cxn = await self._pool.acquire(timeout=deadline - requested)
+            except asyncio.TimeoutError:
+                raise DatabaseOverloaded(
+                    f"no pooled connection free after {self.settings.acquire_timeout}s"
+                )
+            query_metrics.pool_wait.observe(time.perf_counter() - requested)
+            try:
+                yield cxn
+            finally:
+                await self._pool.release(cxn)
+
+    async def _adapt_pool(self, interval: float = 5.0) -> None:
+        """adapts the amount of usable connections to the measured wait time"""
+        while self.is_connected:
+            await asyncio.sleep(interval)
+            self.admission.adapt()
+
     async def close(self) -> None:
         assert self.is_connected, "Not connected."
+        if self._sizer is not None:
+            self._sizer.cancel()
+            self._sizer = None
         await self._pool.close()
         self._connected.clear()
         self.log.info("Closed database connection.")
@@ -115,50 +344,90 @@ class Database(metaclass=Singleton):
     async def execute_many(self, query: str, valueset: List[Any], _cxn: asyncpg.Connection) -> None:
         await _cxn.executemany(query, valueset)
 
-    @acquire
+    @acquire(transaction=False)
     async def val(self, query: str, *values: Any, column: int = 0, _cxn: asyncpg.Connection) -> Any:
         """Returns a value of the first row from a given query"""
         return await _cxn.fetchval(query, *values, column=column)
 
-    @acquire
+    @acquire(transaction=False)
     async def column(
         self, query: str, *values: Any, column: Union[int, str] = 0, _cxn: asyncpg.Connection
     ) -> List[Any]:
         return [record[column] for record in await _cxn.fetch(query, *values)]
 
-    @acquire
+    @acquire(transaction=False)
     async def row(self, query: str, *values: Any, _cxn: asyncpg.Connection) -> Optional[List[Any]]:
         """Returns first row of query"""
         return await _cxn.fetchrow(query, *values)
 
-    @acquire
+    @acquire(transaction=False)
     async def fetch(self, query: str, *values: Any, _cxn: asyncpg.Connection) -> List[asyncpg.Record]:
         """Executes and returns (if specified) a given `query`"""
         return await _cxn.fetch(query, *values)
 
+    @acquire(transaction=False)
+    async def fetch_columns(self, query: str, *values: Any, _cxn: asyncpg.Connection) -> "pd.DataFrame":
+        """
+        Executes `query` and returns the result as DataFrame which is built column by column.
+
+        If all result columns have a fixed width (ints, floats, bool, date, timestamp),
+        the rows are fetched with binary COPY and parsed directly into NumPy arrays.
+        Otherwise the DataFrame is built column-wise from the records.
+        The path is chosen from the result types before the query runs - it runs once.
+        """
+        import pandas as pd
+        from .columnar import FIXED_WIDTH_TYPES, parse_binary_copy, records_to_dataframe
+
+        # preparing only describes the result, nothing is executed
+        statement = await _cxn.prepare(query)
+        columns = [(attribute.name, attribute.type.name) for attribute in statement.get_attributes()]
+        if all(type_name in FIXED_WIDTH_TYPES for _, type_name in columns):
+            buffer = io.BytesIO()
+            await _cxn.copy_from_query(query, *values, output=buffer, format="binary")
+            arrays = parse_binary_copy(buffer.getvalue(), columns)
+            return pd.DataFrame(arrays, columns=[name for name, _ in columns], copy=False)
+        records = await statement.fetch(*values)
+        return records_to_dataframe(records, [name for name, _ in columns])
+
+    async def iterate(
+        self, 
+        query: str, 
+        *values: Any, 
+        prefetch: int = STREAM_PREFETCH
+    ) -> AsyncIterator[asyncpg.Record]:
+        """
+        Streams the records of `query` with a server side cursor.
+        Only `prefetch` records are held in memory at once.
+
+        NOTE:
+        -----
+            - the connection is held until the iteration is finished.
+              Use `contextlib.aclosing` when breaking early
+        """
+        assert self.is_connected, "Not connected."
+        self.calls += 1
+        cxn: asyncpg.Connection | None = _bound_cxn.get()
+        if cxn is not None:
+            async for record in cxn.cursor(query, *values, prefetch=prefetch):
+                yield record
+            return
+        async with self._connection() as cxn:
+            # cursors only exist inside of a transaction
+            async with cxn.transaction():
+                async for record in cxn.cursor(query, *values, prefetch=prefetch):
+                    yield record
+
     @acquire
     async def execute_script(self, path: str, *args: Any, _cxn: asyncpg.Connection) -> None:
+        import aiofiles
+
         async with aiofiles.open(path, "r") as script:
             await _cxn.execute((await script.read()) % args)
 
     @property
-    def query_df(self) -> pd.DataFrame:
-        return pd.DataFrame.from_records(
-            [(dt, calls) for dt, calls in db_calls.items()], 
-            columns=["datetime", "calls"],
-            index="datetime"
-        )
-
-    @property
-    def hourly_queries(self) -> pd.DataFrame:
-        df = self.query_df
-        return df.resample("1h")["calls"].sum()
-
-    @property
-    def daily_queries(self) -> pd.DataFrame:
-        hourly = self.query_df
-        daily = hourly.resample("1d")["calls"].sum()
-        return daily
+    def metrics(self) -> QueryMetrics:
+        """latency, pool wait and error metrics of all queries"""
+        return query_metrics
 
 ######Database
 #### tables
@@ -171,29 +440,163 @@ def debug_logging(reraise_exc: bool = True):
         @wraps(func)
         async def wrapper(*args, **kwargs):
             self = args[0]
-            log = logging.getLogger(f"{__name__}.{self.name}.{func.__name__}")
             try:
                 return_value = await func(*args, **kwargs)
                 if self.do_log:
-                    log.debug(f"{self._executed_sql}\n->{return_value}")
+                    log = logging.getLogger(f"{__name__}.{self.name}.{func.__name__}")
+                    if log.isEnabledFor(logging.DEBUG):
+                        log.debug("%s\n->%s", self._executed_sql, return_value)
                 return return_value
+            except DatabaseOverloaded:
+                # expected under load - the caller answers with 503
+                raise
             except Exception as e:
                 if self._error_logging:
-                    log.error(f"{self._executed_sql}")
-                    log.exception(f"{traceback.format_exc()}")
+                    log = logging.getLogger(f"{__name__}.{self.name}.{func.__name__}")
+                    # the traceback is added by `exception`
+                    log.exception("%s", self._executed_sql)
                     if reraise_exc:
                         raise e
                     return None
         update_wrapper(wrapper, func)
         return wrapper
     return decorator
+class RecordCache:
+    """
+    Read-through cache for single records read with `Table.select_row`.
+    Only tables which are configured in the `cache` section are cached:
+
+    ```yaml
+    cache:
+      max_size: 4096
+      tables:
+        profile.full:
+          ttl: 30
+          invalidated_by: [profile.information, profile.authentication]
+    ```
+
+    NOTE:
+    -----
+        - writes through `Table` invalidate the written table and every
+          table which lists it in `invalidated_by`. Inside of
+          `Database.transaction()` this happens when it commits
+        - every invalidation starts a new generation of the table.
+          Records read under an older one are not stored by `put`
+        - the cache is per process. Writes of other workers are only
+          visible after the TTL is over
+    """
+    def __init__(self, max_size: int, tables: Dict[str, Dict[str, Any]]):
+        self.max_size = max_size
+        self.ttls: Dict[str, float] = {}
+        # written table -> cached tables which depend on it
+        self.dependents: Dict[str, Set[str]] = {}
+        for table, options in tables.items():
+            self.ttls[table] = float(options.get("ttl", 30))
+            self.dependents.setdefault(table, set()).add(table)
+            for source in options.get("invalidated_by", None) or []:
+                self.dependents.setdefault(source, set()).add(table)
+        # key -> (expires at, record)
+        self._entries: OrderedDict[Tuple, Tuple[float, Any]] = OrderedDict()
+        self._keys_by_table: Dict[str, Set[Tuple]] = {}
+        self._generations: Dict[str, int] = {}
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+
+    @classmethod
+    def from_config(cls) -> "RecordCache":
+        section = config_section("cache")
+        if not section:
+            return cls(0, {})
+        tables = section.get("tables", None)
+        tables = {
+            name: options.options 
+            for name, options in (tables.options.items() if tables else [])
+        }
+        return cls(int(section.get("max_size", 4096)), tables)
+
+    def is_cached(self, table: str) -> bool:
+        return table in self.ttls
+
+    def get(self, key: Tuple) -> Tuple[bool, Any]:
+        """
+        Returns:
+        --------
+        `Tuple[bool, Any]`
+            whether the key was found and the cached record
+        """
+        table = key[0]
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                self._remove(key)
+            self.misses[table] = self.misses.get(table, 0) + 1
+            return False, None
+        self._entries.move_to_end(key)
+        self.hits[table] = self.hits.get(table, 0) + 1
+        return True, entry[1]
+
+    def generation(self, table: str) -> int:
+        """the generation of `table` - pass it to `put` with the record read under it"""
+        return self._generations.get(table, 0)
+
+    def put(self, key: Tuple, record: Any, generation: int) -> None:
+        """
+        Stores `record` unless the table was invalidated since `generation`.
+        Otherwise the record could be older than the write which invalidated it
+        """
+        table = key[0]
+        if generation != self._generations.get(table, 0):
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.monotonic() + self.ttls[table], record)
+        self._keys_by_table.setdefault(table, set()).add(key)
+        while len(self._entries) > self.max_size:
+            self._remove(next(iter(self._entries)))
+
+    def invalidate(self, table: str) -> None:
+        """
+        removes all records of `table` and the tables depending on it.
+        Inside of `Database.transaction()` this is deferred until it commits
+        """
+        pending = _pending_invalidations.get()
+        if pending is not None:
+            pending.add(table)
+            return
+        for cached_table in self.dependents.get(table, ()):
+            self._generations[cached_table] = self._generations.get(cached_table, 0) + 1
+            for key in self._keys_by_table.pop(cached_table, ()):
+                self._entries.pop(key, None)
+
+    def _remove(self, key: Tuple) -> None:
+        del self._entries[key]
+        keys = self._keys_by_table.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """hits, misses and size per cached table"""
+        return {
+            table: {
+                "hits": self.hits.get(table, 0),
+                "misses": self.misses.get(table, 0),
+                "size": len(self._keys_by_table.get(table, ())),
+            }
+            for table in self.ttls
+        }
+
+
 # -> Callable[["Table", Any], Callable[[Any], Awaitable]]
 def formatter(func: Callable):
     @wraps(func)
     async def wrapper(*args, **kwargs):
         self = args[0]
         return_value = await func(*args, **kwargs)
-        if self._as_dataframe:
+        if not self._as_dataframe:
+            return return_value
+        import pandas as pd
+
+        if not isinstance(return_value, pd.DataFrame):
             columns = []
             if isinstance(return_value, list):
                 if len(return_value) > 0:
@@ -211,17 +614,38 @@ def formatter(func: Callable):
 
 
 
+@lru_cache(maxsize=None)
+def get_record_cache() -> RecordCache:
+    """the `RecordCache` of all tables, created from the config on first use"""
+    return RecordCache.from_config()
+
+
 class Table():
     do_log = table_logging
     def __init__(self, table_name: str, debug_log: bool = table_logging, error_log: bool = True):
         self.name = table_name
         self.db = Database()
         self.do_log = debug_log
-        self._executed_sql = ""
+        self._last_sql: Tuple[str, List[Any]] = ("", [])
         self._as_dataframe: bool = False
+        self._columnar: bool = False
         self._error_logging = error_log
-    def return_as_dataframe(self, b: bool) -> None:
+    @property
+    def cache(self) -> RecordCache:
+        return get_record_cache()
+
+    def return_as_dataframe(self, b: bool, columnar: bool = False) -> None:
+        """
+        Args:
+        -----
+        b : `bool`
+            whether `select` and `fetch` return a DataFrame
+        columnar : `bool`
+            whether the DataFrame is fetched column-wise (binary COPY where possible).
+            Faster and less memory for large results
+        """
         self._as_dataframe = b
+        self._columnar = columnar
 
 
 
@@ -257,19 +681,68 @@ class Table():
                 new_columns.append(k)
             values, which_columns = new_values, new_columns
 
-        values_chain = [f'${num}' for num in range(1, len(values)+1)]
-        sql = (
-            f"INSERT INTO {self.name} ({', '.join(which_columns)})\n"
-            f"VALUES ({', '.join(values_chain)})\n" 
-        )
-        if on_conflict:
-            sql += f"ON CONFLICT {on_conflict}\n"
-        if returning:
-            sql += f"RETURNING {returning}\n"
+        sql = self._insert_template(self.name, tuple(which_columns), on_conflict, returning)
         self._create_sql_log_message(sql, values)
-        return_values = await self.db.fetch(sql, *values)
+        return_values = await self.db.fetch(sql, *values, _table=self.name)
+        self.cache.invalidate(self.name)
         return return_values
 
+    @debug_logging()
+    async def insert_cascade(
+        self,
+        values: Dict[str, Any],
+        child: Union["Table", str],
+        child_values: Dict[str, Any],
+        link: Tuple[str, str] = ("user_id", "id"),
+        on_conflict: str = "",
+        returning: str = "*",
+    ) -> Optional[List[asyncpg.Record]]:
+        """
+        Inserts a row into this table and a dependent row into `child`
+        with one CTE - one statement, one round trip and one transaction.
+
+        WITH parent AS (INSERT INTO `this` ... RETURNING <link[1]>)
+        INSERT INTO <child> (<link[0]>, ...) SELECT parent.<link[1]>, ... FROM parent
+        RETURNING <returning>
+
+        Args:
+        -----
+        values : `Dict[str, Any]`
+            the columns and values for this table
+        child : `Table | str`
+            the table which references this table
+        child_values : `Dict[str, Any]`
+            the columns and values for `child` (without the linking column)
+        link : `Tuple[str, str]`
+            (column of `child`, referenced column of this table)
+        on_conflict : `str`
+            ON CONFLICT clause for this table. With `DO NOTHING` a conflict
+            inserts nothing and an empty list is returned
+        returning : `str`
+            the column(s) of `child` which should be returned
+
+        Returns:
+        --------
+        `List[asyncpg.Record]`
+            the inserted rows of `child`
+        """
+        child_name = child.name if isinstance(child, Table) else child
+        sql = self._insert_cascade_template(
+            self.name, 
+            tuple(values.keys()), 
+            child_name, 
+            tuple(child_values.keys()), 
+            link, 
+            on_conflict, 
+            returning
+        )
+        sql_values = [*values.values(), *child_values.values()]
+        self._create_sql_log_message(sql, sql_values)
+        records = await self.db.fetch(sql, *sql_values, _table=self.name)
+        self.cache.invalidate(self.name)
+        self.cache.invalidate(child_name)
+        return records
+
     @debug_logging()
     @formatter
     async def upsert(
@@ -291,26 +764,10 @@ class Table():
         if where:
             which_columns = list(where.keys())
             values = list(where.values())
-        values_chain = [f'${num}' for num in range(1, len(values)+1)]
-        update_set_query = ""
-        for i, item in enumerate(zip(which_columns, values_chain)):
-            if i == 0:
-                continue
-            update_set_query += f"{item[0]}={item[1]}, "
-        update_set_query = update_set_query[:-2]  # remove last ","
-        on_conflict_values = which_columns[0]
-        if compound_of:
-            on_conflict_values = ", ".join(c for c in which_columns[:compound_of])
-        sql = (
-            f"INSERT INTO {self.name} ({', '.join(which_columns)}) \n"
-            f"VALUES ({', '.join(values_chain)}) \n"
-            f"ON CONFLICT ({on_conflict_values}) DO UPDATE \n"
-            f"SET {update_set_query} \n"
-        )
-        if returning:
-            sql += f"RETURNING {returning} \n"
+        sql = self._upsert_template(self.name, tuple(which_columns), compound_of, returning)
         self._create_sql_log_message(sql, values)
-        return_values = await self.db.execute(sql, *values)
+        return_values = await self.db.execute(sql, *values, _table=self.name)
+        self.cache.invalidate(self.name)
         return return_values   
 
     @debug_logging()
@@ -327,19 +784,11 @@ class Table():
         set : Dict[str, Any]
             the
         """
-        num_gen = (num for num in range(1,100))
-        update_set_query = ", ".join([f'{col_name}=${i}' for i, col_name in zip(num_gen, set.keys())])
-        next_ = next(num_gen) -1  # otherwise it would be one to high - python bug?
-        sql = (
-            f"UPDATE {self.name} \n"
-            f"SET {update_set_query} \n"
-            f"WHERE {self.__class__.create_where_statement([*where.keys()], dollar_start=next_)}\n"
-        )
-        if returning:
-            sql += f"RETURNING {returning} \n"
+        sql = self._update_template(self.name, tuple(set.keys()), tuple(where.keys()), returning)
         values = [*set.values(), *where.values()]
         self._create_sql_log_message(sql, values)
-        return_values = await self.db.execute(sql, *values)
+        return_values = await self.db.execute(sql, *values, _table=self.name)
+        self.cache.invalidate(self.name)
         return return_values   
 
     @debug_logging()
@@ -358,16 +807,11 @@ class Table():
         if where:
             columns = [*where.keys()]
             matching_values = [*where.values()]
-        where = self.__class__.create_where_statement(columns)
-
-        sql = (
-            f"DELETE FROM {self.name}\n"
-            f"WHERE {where}\n"
-            f"RETURNING *"
-        )
+        sql = self._delete_template(self.name, tuple(columns))
         self._create_sql_log_message(sql, matching_values)
 
-        records = await self.db.fetch(sql, *matching_values)
+        records = await self.db.fetch(sql, *matching_values, _table=self.name)
+        self.cache.invalidate(self.name)
         return records
 
     @debug_logging()
@@ -404,26 +848,95 @@ class Table():
             for k, v in where.items():
                 columns.append(k)
                 matching_values.append(v)
-        where_stmt = self.__class__.create_where_statement(columns)
-        sql = (
-            f"SELECT {select} FROM {self.name}\n"
-            f"WHERE {where_stmt}"
-        )
-        if order_by:
-            sql += f"\nORDER BY {order_by}"
+        sql = self._select_template(self.name, tuple(columns), select, order_by)
         if additional_values:
             matching_values.extend(additional_values)
         self._create_sql_log_message(sql, matching_values)
 
-        records = await self.db.fetch(sql, *matching_values)
+        if self._as_dataframe and self._columnar:
+            return await self.db.fetch_columns(sql, *matching_values, _table=self.name)
+        records = await self.db.fetch(sql, *matching_values, _table=self.name)
         return records
 
+    async def stream(
+        self, 
+        columns: List[str] | None = None, 
+        matching_values: List | None = None,
+        order_by: Optional[str] = None, 
+        where: Optional[Dict[str, Any]] = None,
+        select: str = "*",
+        prefetch: int = STREAM_PREFETCH,
+    ) -> AsyncIterator[asyncpg.Record]:
+        """
+        SELECT <select> FROM `this`
+        [WHERE <columns>=<matching_values>]
+        [ORDER BY <order_by>]
+
+        Like `select`, but yields the records one by one from a server side cursor
+        which fetches `prefetch` records per round trip. Without `columns` or 
+        `where` all records are streamed.
+
+        Example:
+        --------
+        ```py
+        async for record in Table("profile.information").stream(order_by="id"):
+            self.write(json.dumps(dict(record), default=str) + "\\n")
+            await self.flush()
+        ```
+        """
+        if where:
+            columns = [*where.keys()]
+            matching_values = [*where.values()]
+        sql = self._select_template(self.name, tuple(columns or ()), select, order_by)
+        matching_values = matching_values or []
+        self._create_sql_log_message(sql, matching_values)
+        async for record in self.db.iterate(sql, *matching_values, prefetch=prefetch):
+            yield record
+
     async def select_row(self, columns: List[str] = None, matching_values: List = None, where: Dict[str, Any] | None = None, select: str = "*") -> Optional[asyncpg.Record]:
+        """
+        Returns the first matching record.
+        Records of tables in the `cache` config are served from `Table.cache`
+        """
+        cache_key = self._cache_key(columns, matching_values, where, select)
+        if cache_key is not None:
+            found, record = self.cache.get(cache_key)
+            if found:
+                return record
+            generation = self.cache.generation(self.name)
         records = await self.select(columns, matching_values, where=where, select=select)
         if not records:
             return None
+        if cache_key is not None:
+            self.cache.put(cache_key, records[0], generation)
         return records[0]
 
+    def _cache_key(
+        self, 
+        columns: List[str] | None, 
+        matching_values: List | None, 
+        where: Dict[str, Any] | None, 
+        select: str
+    ) -> Optional[Tuple]:
+        """
+        Returns the key for `Table.cache` or None if the read can't be cached
+        """
+        if (
+            not self.cache.is_cached(self.name)
+            or self._as_dataframe
+            # uncommitted data of an unit of work must not be cached
+            or _bound_cxn.get() is not None
+        ):
+            return None
+        if where:
+            columns, matching_values = [*where.keys()], [*where.values()]
+        key = (self.name, select, tuple(columns or ()), tuple(matching_values or ()))
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
     async def delete_by_id(self, column: str, id: Any) -> Optional[Dict]:
         """
         Delete a record by it's id
@@ -450,9 +963,18 @@ class Table():
     async def fetch(self, sql: str, *args) -> Optional[List[asyncpg.Record]]:
         """
         Execute custom SQL with return
+
+        NOTE:
+        -----
+            - the SQL could write, hence the cache of this table is invalidated
         """
         self._create_sql_log_message(sql, [*args])
-        return await self.db.fetch(sql, *args)
+        if self._as_dataframe and self._columnar:
+            records = await self.db.fetch_columns(sql, *args, _table=self.name)
+        else:
+            records = await self.db.fetch(sql, *args, _table=self.name)
+        self.cache.invalidate(self.name)
+        return records
 
     @staticmethod
     def create_where_statement(columns: List[str], dollar_start: int = 1) -> str:
@@ -462,12 +984,146 @@ class Table():
         return where[4:]  # cut first and
     
     def _create_sql_log_message(self, sql:str, values: List):
-        self._executed_sql = (
+        # only store the parts - the message itself is built lazily
+        # when it's actually logged
+        self._last_sql = (sql, values)
+
+    @property
+    def _executed_sql(self) -> str:
+        sql, values = self._last_sql
+        return (
             f"SQL:\n"
             f"{sql}\n"
             f"WITH VALUES: {values}"
         )
 
+    # SQL templates
+    # -------------
+    # The generated SQL only depends on the operation, the table and the
+    # column signature - never on the values. Hence the templates are cached,
+    # which also keeps the SQL text stable for asyncpg's statement cache.
+
+    @staticmethod
+    @lru_cache(maxsize=SQL_TEMPLATE_CACHE_SIZE)
+    def _insert_template(
+        table: str, 
+        columns: Tuple[str, ...], 
+        on_conflict: str, 
+        returning: str
+    ) -> str:
+        values_chain = [f'${num}' for num in range(1, len(columns)+1)]
+        sql = (
+            f"INSERT INTO {table} ({', '.join(columns)})\n"
+            f"VALUES ({', '.join(values_chain)})\n" 
+        )
+        if on_conflict:
+            sql += f"ON CONFLICT {on_conflict}\n"
+        if returning:
+            sql += f"RETURNING {returning}\n"
+        return sql
+
+    @staticmethod
+    @lru_cache(maxsize=SQL_TEMPLATE_CACHE_SIZE)
+    def _insert_cascade_template(
+        table: str,
+        columns: Tuple[str, ...],
+        child: str,
+        child_columns: Tuple[str, ...],
+        link: Tuple[str, str],
+        on_conflict: str,
+        returning: str,
+    ) -> str:
+        child_column, parent_column = link
+        values_chain = [f'${num}' for num in range(1, len(columns)+1)]
+        child_values_chain = [
+            f'${num}' for num in range(len(columns)+1, len(columns)+len(child_columns)+1)
+        ]
+        sql = (
+            f"WITH parent AS (\n"
+            f"INSERT INTO {table} ({', '.join(columns)})\n"
+            f"VALUES ({', '.join(values_chain)})\n"
+        )
+        if on_conflict:
+            sql += f"ON CONFLICT {on_conflict}\n"
+        sql += (
+            f"RETURNING {parent_column}\n"
+            f")\n"
+            f"INSERT INTO {child} ({', '.join((child_column, *child_columns))})\n"
+            f"SELECT {', '.join((f'parent.{parent_column}', *child_values_chain))} FROM parent\n"
+        )
+        if returning:
+            sql += f"RETURNING {returning}\n"
+        return sql
+
+    @staticmethod
+    @lru_cache(maxsize=SQL_TEMPLATE_CACHE_SIZE)
+    def _upsert_template(
+        table: str, 
+        columns: Tuple[str, ...], 
+        compound_of: int, 
+        returning: str
+    ) -> str:
+        values_chain = [f'${num}' for num in range(1, len(columns)+1)]
+        update_set_query = ", ".join(
+            f"{column}={value}" for column, value in zip(columns[1:], values_chain[1:])
+        )
+        on_conflict_values = columns[0]
+        if compound_of:
+            on_conflict_values = ", ".join(c for c in columns[:compound_of])
+        sql = (
+            f"INSERT INTO {table} ({', '.join(columns)}) \n"
+            f"VALUES ({', '.join(values_chain)}) \n"
+            f"ON CONFLICT ({on_conflict_values}) DO UPDATE \n"
+            f"SET {update_set_query} \n"
+        )
+        if returning:
+            sql += f"RETURNING {returning} \n"
+        return sql
+
+    @staticmethod
+    @lru_cache(maxsize=SQL_TEMPLATE_CACHE_SIZE)
+    def _update_template(
+        table: str, 
+        set_columns: Tuple[str, ...], 
+        where_columns: Tuple[str, ...], 
+        returning: str
+    ) -> str:
+        update_set_query = ", ".join(
+            f'{col_name}=${i}' for i, col_name in enumerate(set_columns, start=1)
+        )
+        sql = (
+            f"UPDATE {table} \n"
+            f"SET {update_set_query} \n"
+            f"WHERE {Table.create_where_statement(where_columns, dollar_start=len(set_columns)+1)}\n"
+        )
+        if returning:
+            sql += f"RETURNING {returning} \n"
+        return sql
+
+    @staticmethod
+    @lru_cache(maxsize=SQL_TEMPLATE_CACHE_SIZE)
+    def _delete_template(table: str, columns: Tuple[str, ...]) -> str:
+        return (
+            f"DELETE FROM {table}\n"
+            f"WHERE {Table.create_where_statement(columns)}\n"
+            f"RETURNING *"
+        )
+
+    @staticmethod
+    @lru_cache(maxsize=SQL_TEMPLATE_CACHE_SIZE)
+    def _select_template(
+        table: str, 
+        columns: Tuple[str, ...], 
+        select: str, 
+        order_by: Optional[str]
+    ) -> str:
+        sql = f"SELECT {select} FROM {table}"
+        if columns:
+            sql += f"\nWHERE {Table.create_where_statement(columns)}"
+        if order_by:
+            sql += f"\nORDER BY {order_by}"
+        return sql
+
     async def execute(self, sql: str, *args) -> Optional[List[asyncpg.Record]]:
         """
         Execute custom SQL with return
@@ -0,0 +1,11 @@
+from typing import *
+
+
+class ServiceOverloaded(RuntimeError):
+    """
+    raised when a service rejects work instead of queueing it without limit.
+    Handlers should answer with `503 Service Unavailable`
+    """
+    def __init__(self, message: str, retry_after: float = 1.0):
+        self.retry_after = retry_after
+        super().__init__(message)
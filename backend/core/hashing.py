@@ -0,0 +1,112 @@
+"""Runs bcrypt outside of the event loop"""
+from typing import *
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import os
+import time
+
+import bcrypt
+
+from .singleton import Singleton
+from .config import config_section
+from .errors import ServiceOverloaded
+
+__all__: Final[Sequence[str]] = ["PasswordHasher", "HasherOverloaded"]
+
+
+class HasherOverloaded(ServiceOverloaded):
+    """raised when too many password operations are pending"""
+
+
+class PasswordHasher(metaclass=Singleton):
+    """
+    Hashes and checks passwords on a bounded thread pool.
+    bcrypt releases the GIL, hence threads are sufficient to
+    keep the event loop (and with it every websocket) responsive.
+
+    NOTE:
+    -----
+        - at most `workers` hashes run at the same time, `max_queue` wait.
+          Everything above is rejected with `HasherOverloaded`
+    """
+    def __init__(self, workers: int | None = None, max_queue: int | None = None):
+        self.log = logging.getLogger(self.__class__.__name__)
+        section = config_section("hashing")
+        self.workers: int = workers or int(section.get("workers", os.cpu_count() or 2))
+        self.max_queue: int = max_queue or int(section.get("max_queue", 64))
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.workers, 
+            thread_name_prefix="bcrypt"
+        )
+        self._pending = 0
+        self.rejected = 0
+        self.completed = 0
+        # recent queue/run times in seconds
+        self._queue_times: Deque[float] = deque(maxlen=1024)
+        self._run_times: Deque[float] = deque(maxlen=1024)
+
+    @property
+    def pending(self) -> int:
+        """the amount of running and queued operations"""
+        return self._pending
+
+    async def hashpw(self, password: str) -> Tuple[str, str]:
+        """
+        Returns:
+        --------
+        `Tuple[str, str]`
+            the salt and the hashed password
+        """
+        salt: bytes = bcrypt.gensalt()
+        hashed: bytes = await self._run(bcrypt.hashpw, password.encode(), salt)
+        return salt.decode(), hashed.decode()
+
+    async def checkpw(self, password: str, password_hash: str) -> bool:
+        """whether `password` matches `password_hash`"""
+        return await self._run(bcrypt.checkpw, password.encode(), password_hash.encode())
+
+    async def _run(self, func: Callable[..., Any], *args: Any) -> Any:
+        if self._pending >= self.workers + self.max_queue:
+            self.rejected += 1
+            raise HasherOverloaded(
+                f"{self._pending} password operations pending",
+                retry_after=1.0,
+            )
+        submitted = time.perf_counter()
+
+        def timed() -> Any:
+            started = time.perf_counter()
+            try:
+                return func(*args)
+            finally:
+                self._queue_times.append(started - submitted)
+                self._run_times.append(time.perf_counter() - started)
+
+        self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, timed)
+        finally:
+            self._pending -= 1
+            self.completed += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """queue and run time percentiles (in ms) of the recent operations"""
+        def percentile(values: Deque[float], p: float) -> float:
+            if not values:
+                return 0.0
+            ordered = sorted(values)
+            return ordered[min(len(ordered) - 1, int(len(ordered) * p))] * 1000
+
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "pending": self._pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "queue_ms_p50": percentile(self._queue_times, 0.5),
+            "queue_ms_p95": percentile(self._queue_times, 0.95),
+            "run_ms_p50": percentile(self._run_times, 0.5),
+            "run_ms_p95": percentile(self._run_times, 0.95),
+        }
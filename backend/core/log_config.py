@@ -0,0 +1,115 @@
+"""Logging setup: structured records, written by a background thread"""
+from typing import *
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+
+from .config import config_section
+
+__all__: Final[Sequence[str]] = ["setup_logging", "JsonFormatter"]
+
+# attributes every LogRecord has - everything else was passed with `extra=`
+_RECORD_ATTRIBUTES: Final[FrozenSet[str]] = frozenset(
+    logging.LogRecord("", 0, "", 0, "", (), None).__dict__
+) | {"message", "asctime", "taskName"}
+TEXT_FORMAT: Final[str] = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+_listener: logging.handlers.QueueListener | None = None
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats a record as one JSON object per line. Fields passed with
+    `extra={...}` become keys of the object.
+    """
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    Puts a copy of the unformatted record into the queue. `QueueHandler.prepare`
+    would format it in the calling thread and drop its `exc_info`
+    """
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return copy.copy(record)
+
+
+def setup_logging(section: Dict[str, Any] | None = None) -> None:
+    """
+    Configures the root logger from the `logging` config section:
+        - `level`: level of the root logger
+        - `format`: `text` or `json`
+        - `levels`: list of `logger name: level`, e.g. `- core.db: WARNING`
+
+    Loggers only put records into a queue (`DeferredQueueHandler`).
+    Formatting and writing to stderr happens in a `QueueListener` thread,
+    hence neither a slow terminal or pipe nor formatting blocks the event loop.
+
+    NOTE:
+    -----
+        - calling it again replaces the previous setup
+        - log calls should pass arguments (`log.debug("x %s", y)`) instead of
+          f-strings - then nothing is formatted when the level is off
+        - the arguments are formatted later in the listener thread.
+          Pass values which are not changed afterwards
+    """
+    global _listener
+    if section is None:
+        section = config_section("logging")
+    stream_handler = logging.StreamHandler(sys.stderr)
+    if str(section.get("format", "text")).lower() == "json":
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    if _listener is not None:
+        _listener.stop()
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(records, stream_handler, respect_handler_level=True)
+    _listener.start()
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(DeferredQueueHandler(records))
+    root.setLevel(str(section.get("level", "INFO")).upper())
+    for name, level in _logger_levels(section.get("levels")):
+        logging.getLogger(name).setLevel(str(level).upper())
+
+
+def _logger_levels(levels: Any) -> Iterator[Tuple[str, str]]:
+    """
+    `levels` is a list of `{logger: level}` mappings. Mappings in the config
+    become case insensitive SectionProxies, logger names are case sensitive
+    """
+    if not levels:
+        return
+    if not isinstance(levels, list):
+        levels = [getattr(levels, "options", levels)]
+    for entry in levels:
+        yield from entry.items()
+
+
+@atexit.register
+def _flush() -> None:
+    """writes the records still in the queue on shutdown"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,112 @@
+"""Measures how late the event loop runs its callbacks"""
+from typing import *
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+
+from .singleton import Singleton
+from .config import config_section
+from .metrics import Metrics, RollingHistogram
+
+__all__: Final[Sequence[str]] = ["LoopMonitor"]
+
+
+class LoopMonitor(metaclass=Singleton):
+    """
+    Samples the event loop lag: a task sleeps `interval` seconds and
+    records how much later than requested it woke up. Everything running
+    on the loop (bcrypt, move generation, large JSON encodes) delays it.
+
+    A watchdog thread checks whether the sampler is overdue by more than
+    `slow_callback` seconds. If so, the loop is stuck in a callback and
+    the current stack of the loop thread is logged - once per stall.
+
+    NOTE:
+    -----
+        - the lag histogram is exposed on `/metrics`
+        - the watchdog only reads the timestamp of the last sample,
+          it never touches the loop
+    """
+    def __init__(self, interval: float | None = None, slow_callback: float | None = None):
+        self.log = logging.getLogger(self.__class__.__name__)
+        section = config_section("monitor")
+        # seconds between two samples
+        self.interval: float = interval or float(section.get("interval", 0.1))
+        # seconds a callback may block the loop before its stack is logged
+        self.slow_callback: float = slow_callback or float(section.get("slow_callback", 0.25))
+        # thresholds of `/ready` - lag p95 in seconds and database pool saturation
+        self.max_lag: float = float(section.get("max_lag", 0.5))
+        self.max_saturation: float = float(section.get("max_saturation", 0.9))
+        self.lag = RollingHistogram(windows=3, window_seconds=5)
+        self.last_lag = 0.0
+        self.slow_callbacks = 0
+        self._heartbeat = time.monotonic()
+        self._loop_thread: int | None = None
+        self._task: asyncio.Task | None = None
+        self._stop = threading.Event()
+        self._watchdog: threading.Thread | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        """starts sampling the running loop. Has to be called from within the loop"""
+        if self.running:
+            return
+        self._loop_thread = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.get_running_loop().create_task(self._sample())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+        Metrics.register("event_loop", self.render)
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        Metrics.unregister("event_loop")
+
+    async def _sample(self) -> None:
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self.last_lag = max(0.0, now - expected)
+            self.lag.observe(self.last_lag, now)
+            self._heartbeat = now
+
+    def _watch(self) -> None:
+        """runs in its own thread and logs the stack of the loop thread while it's blocked"""
+        reported: float | None = None
+        while not self._stop.wait(self.slow_callback / 2):
+            heartbeat = self._heartbeat
+            blocked = time.monotonic() - heartbeat - self.interval
+            if blocked < self.slow_callback or reported == heartbeat:
+                continue
+            reported = heartbeat
+            self.slow_callbacks += 1
+            frame = sys._current_frames().get(self._loop_thread)  # type: ignore[arg-type]
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else "<unknown>"
+            self.log.warning("event loop blocked for at least %.3fs in:\n%s", blocked, stack)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "lag": self.last_lag,
+            "lag_p95": self.lag.quantile(0.95),
+            "slow_callbacks": self.slow_callbacks,
+            "running": self.running,
+        }
+
+    def render(self) -> Iterator[str]:
+        yield "# HELP reversi_event_loop_lag_seconds Delay of the event loop"
+        yield "# TYPE reversi_event_loop_lag_seconds histogram"
+        yield from self.lag.render("reversi_event_loop_lag_seconds", {})
+        yield "# HELP reversi_event_loop_slow_callbacks_total Callbacks which blocked the loop longer than slow_callback"
+        yield "# TYPE reversi_event_loop_slow_callbacks_total counter"
+        yield f"reversi_event_loop_slow_callbacks_total {self.slow_callbacks}"
@@ -0,0 +1,224 @@
+"""In-process metrics with a fixed memory footprint, rendered in Prometheus text format"""
+from typing import *
+from bisect import bisect_left
+from collections import OrderedDict
+import math
+import time
+
+__all__: Final[Sequence[str]] = [
+    "RollingHistogram",
+    "LabeledHistograms",
+    "Metrics",
+    "DEFAULT_BUCKETS",
+]
+
+# upper bounds in seconds
+DEFAULT_BUCKETS: Final[Tuple[float, ...]] = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, math.inf
+)
+
+
+def escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{escape_label(str(v))}"' for k, v in labels.items()) + "}"
+
+
+class RollingHistogram:
+    """
+    Histogram with fixed buckets over a rolling time window.
+    The window consists of `windows` slots of `window_seconds` each -
+    old slots are reset when they are reused, hence the memory never grows.
+
+    NOTE:
+    -----
+        - the totals (`total_counts`, `total_count`, `total_sum`) are never reset.
+          `render` exports them - Prometheus histograms are cumulative
+        - the window is for decisions in the process (`quantile`)
+    """
+    __slots__ = (
+        "buckets", "windows", "window_seconds", "_counts", "_sums", "_slot_ids",
+        "_index", "_slot_end", "total_counts", "total_count", "total_sum"
+    )
+
+    def __init__(
+        self,
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+        windows: int = 5,
+        window_seconds: float = 60.0
+    ):
+        self.buckets: Tuple[float, ...] = tuple(buckets)
+        self.windows = windows
+        self.window_seconds = window_seconds
+        self._counts: List[List[int]] = [[0] * len(self.buckets) for _ in range(windows)]
+        self._sums: List[float] = [0.0] * windows
+        self._slot_ids: List[int] = [-1] * windows
+        # index and end of the current slot
+        self._index = 0
+        self._slot_end = -math.inf
+        # per bucket, since the start
+        self.total_counts: List[int] = [0] * len(self.buckets)
+        self.total_count = 0
+        self.total_sum = 0.0
+
+    def observe(self, value: float, now: float | None = None) -> None:
+        """
+        Args:
+        -----
+        value : `float`
+            the observed value
+        now : `float | None`
+            the current `time.monotonic()`, if the caller already has it
+        """
+        if now is None:
+            now = time.monotonic()
+        if now >= self._slot_end:
+            self._rotate(now)
+        index = self._index
+        bucket = bisect_left(self.buckets, value)
+        self._counts[index][bucket] += 1
+        self.total_counts[bucket] += 1
+        self._sums[index] += value
+        self.total_count += 1
+        self.total_sum += value
+
+    def _rotate(self, now: float) -> None:
+        """moves to the slot of `now` and resets it if it's reused"""
+        slot_id = int(now / self.window_seconds)
+        index = slot_id % self.windows
+        if self._slot_ids[index] != slot_id:
+            self._slot_ids[index] = slot_id
+            self._counts[index] = [0] * len(self.buckets)
+            self._sums[index] = 0.0
+        self._index = index
+        self._slot_end = (slot_id + 1) * self.window_seconds
+
+    def snapshot(self) -> Tuple[List[int], float, int]:
+        """
+        Returns:
+        --------
+        `Tuple[List[int], float, int]`
+            the cumulative bucket counts, the sum and the count of the current window
+        """
+        oldest = int(time.monotonic() / self.window_seconds) - self.windows + 1
+        counts = [0] * len(self.buckets)
+        total = 0.0
+        for index, slot_id in enumerate(self._slot_ids):
+            if slot_id < oldest:
+                continue
+            for bucket, count in enumerate(self._counts[index]):
+                counts[bucket] += count
+            total += self._sums[index]
+        cumulative: List[int] = []
+        running = 0
+        for count in counts:
+            running += count
+            cumulative.append(running)
+        return cumulative, total, running
+
+    def quantile(self, q: float) -> float:
+        """the upper bound of the bucket which contains the `q` quantile of the window"""
+        cumulative, _, count = self.snapshot()
+        if count == 0:
+            return 0.0
+        rank = q * count
+        for bound, running in zip(self.buckets, cumulative):
+            if running >= rank:
+                return bound
+        return self.buckets[-1]
+
+    def render(self, name: str, labels: Dict[str, str]) -> Iterator[str]:
+        """the cumulative buckets, sum and count since the start"""
+        running = 0
+        for bound, count in zip(self.buckets, self.total_counts):
+            running += count
+            le = "+Inf" if math.isinf(bound) else repr(bound)
+            yield f"{name}_bucket{format_labels({**labels, 'le': le})} {running}"
+        yield f"{name}_sum{format_labels(labels)} {self.total_sum}"
+        yield f"{name}_count{format_labels(labels)} {self.total_count}"
+
+
+class LabeledHistograms:
+    """
+    A family of `RollingHistogram`s and error counters keyed by a label value.
+    At most `max_series` label values are kept - the least recently used one is dropped.
+    """
+    def __init__(
+        self,
+        name: str,
+        label: str,
+        help: str,
+        max_series: int = 256,
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.label = label
+        self.help = help
+        self.max_series = max_series
+        self.buckets = buckets
+        self._series: OrderedDict[str, RollingHistogram] = OrderedDict()
+        self.errors: Dict[str, int] = {}
+
+    def get(self, value: str) -> RollingHistogram:
+        histogram = self._series.get(value)
+        if histogram is None:
+            histogram = RollingHistogram(self.buckets)
+            self._series[value] = histogram
+            if len(self._series) > self.max_series:
+                dropped, _ = self._series.popitem(last=False)
+                self.errors.pop(dropped, None)
+        else:
+            self._series.move_to_end(value)
+        return histogram
+
+    def observe(self, value: str, seconds: float) -> None:
+        self.get(value).observe(seconds)
+
+    def error(self, value: str) -> None:
+        self.get(value)
+        self.errors[value] = self.errors.get(value, 0) + 1
+
+    def items(self) -> Iterator[Tuple[str, RollingHistogram]]:
+        return iter(list(self._series.items()))
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for value, histogram in self.items():
+            yield from histogram.render(self.name, {self.label: value})
+        if self.errors:
+            yield f"# TYPE {self.name}_errors_total counter"
+            for value, errors in list(self.errors.items()):
+                yield f"{self.name}_errors_total{format_labels({self.label: value})} {errors}"
+
+
+class Metrics:
+    """registry of everything rendered by the `/metrics` endpoint"""
+    _collectors: Dict[str, Callable[[], Iterable[str]]] = {}
+
+    @classmethod
+    def register(cls, name: str, render: Callable[[], Iterable[str]]) -> None:
+        """
+        Args:
+        -----
+        name : `str`
+            unique name of the collector. Registering it again replaces it
+        render : `Callable[[], Iterable[str]]`
+            returns the lines in Prometheus text format
+        """
+        cls._collectors[name] = render
+
+    @classmethod
+    def unregister(cls, name: str) -> None:
+        cls._collectors.pop(name, None)
+
+    @classmethod
+    def render(cls) -> str:
+        lines: List[str] = []
+        for render in list(cls._collectors.values()):
+            lines.extend(render())
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,162 @@
+"""Sampling CPU profiler, tracemalloc snapshots and live object counts for debugging a running server"""
+from typing import *
+import asyncio
+from collections import Counter
+import gc
+import linecache
+import sys
+import threading
+import time
+import tracemalloc
+
+__all__: Final[Sequence[str]] = ["SamplingProfiler", "MemoryTracer", "count_instances"]
+
+
+class SamplingProfiler:
+    """
+    Profiles by looking at the stacks of all threads every `interval` seconds
+    from a separate thread. Unlike `cProfile` nothing is hooked into the
+    profiled code, hence the overhead is the sampling itself and it's safe
+    to run on a live server.
+
+    The result is in the collapsed stack format (`frame;frame;frame count`)
+    which flamegraph.pl and speedscope read directly.
+    """
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples: Counter[str] = Counter()
+        self.sample_count = 0
+        self.started: float | None = None
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if self.running:
+            raise RuntimeError("profiler is already running")
+        self.samples.clear()
+        self.sample_count = 0
+        self._stop.clear()
+        self.started = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def request_stop(self) -> None:
+        """lets the sampling thread end after its current sample - without waiting for it"""
+        self._stop.set()
+
+    def stop(self) -> None:
+        """ends the sampling thread and waits for it. Blocks - use `run` on the event loop"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self.started is not None:
+            self.duration = time.monotonic() - self.started
+
+    async def run(self, seconds: float) -> None:
+        """profiles for `seconds` or until `request_stop` is called"""
+        self.start()
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, self._stop.wait, seconds)
+        finally:
+            # the thread may be in the middle of a sample - don't block the loop on it
+            self._stop.set()
+            await loop.run_in_executor(None, self.stop)
+
+    def _run(self) -> None:
+        own_thread = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread:
+                    continue
+                stack: List[str] = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({code.co_filename}:{frame.f_lineno})")
+                    frame = frame.f_back
+                if thread_id not in names:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.samples[";".join(reversed(stack))] += 1
+            self.sample_count += 1
+
+    def collapsed(self) -> Iterator[str]:
+        """the stacks in collapsed format, most frequent first"""
+        for stack, count in self.samples.most_common():
+            yield f"{stack} {count}\n"
+
+
+class MemoryTracer:
+    """
+    Wraps `tracemalloc`. Tracing costs memory and time for every allocation,
+    hence it's only enabled between `start` and `stop`.
+    """
+    def __init__(self) -> None:
+        self._previous: tracemalloc.Snapshot | None = None
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, frames: int = 10) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        self._previous = None
+
+    def stop(self) -> None:
+        tracemalloc.stop()
+        self._previous = None
+
+    def snapshot(self, limit: int = 50, compare: bool = False) -> Iterator[str]:
+        """
+        Takes a snapshot and yields a report of the allocation sites
+        which hold the most memory.
+
+        Args:
+        -----
+        limit : `int`
+            amount of allocation sites in the report
+        compare : `bool`
+            report the difference to the previous snapshot instead
+        """
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("tracemalloc is not tracing")
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, linecache.__file__),
+        ))
+        current, peak = tracemalloc.get_traced_memory()
+        yield f"traced memory: {current / 1024:.1f} KiB (peak {peak / 1024:.1f} KiB)\n"
+        if compare and self._previous is not None:
+            stats: List[Any] = snapshot.compare_to(self._previous, "lineno")
+            yield f"top {limit} differences to the previous snapshot:\n"
+        else:
+            stats = snapshot.statistics("lineno")
+            yield f"top {limit} allocation sites:\n"
+        for stat in stats[:limit]:
+            yield f"{stat}\n"
+        self._previous = snapshot
+
+
+def count_instances(classes: Iterable[type]) -> Dict[str, int]:
+    """
+    Counts the live instances of `classes` (subclasses included) in the gc-tracked objects.
+
+    NOTE:
+    -----
+        - walks every object of the process - it's meant for debugging, not for metrics
+    """
+    classes = tuple(classes)
+    counts = {cls.__name__: 0 for cls in classes}
+    for obj in gc.get_objects():
+        for cls in classes:
+            if isinstance(obj, cls):
+                name = type(obj).__name__ if type(obj) is not cls else cls.__name__
+                counts[name] = counts.get(name, 0) + 1
+    return counts
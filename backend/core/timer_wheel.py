@@ -0,0 +1,156 @@
+"""A hierarchical timer wheel - one ticking task for any amount of timers"""
+from typing import *
+import asyncio
+import logging
+import time
+
+__all__: Final[Sequence[str]] = ["TimerWheel", "Timer"]
+
+SLOT_BITS: Final[int] = 6
+SLOTS: Final[int] = 1 << SLOT_BITS
+SLOT_MASK: Final[int] = SLOTS - 1
+
+
+class Timer:
+    """handle of a scheduled callback"""
+    __slots__ = ("expires", "callback", "args", "_slot")
+
+    def __init__(self, expires: int, callback: Callable[..., Any], args: Tuple[Any, ...]):
+        # tick in which the timer fires
+        self.expires = expires
+        self.callback = callback
+        self.args = args
+        self._slot: Set["Timer"] | None = None
+
+    @property
+    def active(self) -> bool:
+        return self._slot is not None
+
+
+class TimerWheel:
+    """
+    `levels` wheels of 64 slots. Level 0 has one slot per tick, every
+    slot of level n covers a whole turn of level n - 1. Timers are put
+    into the slot of the lowest level which reaches their expiry and are
+    moved down a level when the lower wheel wraps around.
+
+    `schedule`, `cancel` and `reschedule` are O(1). A tick fires the
+    timers of one slot and once per 64 ticks moves one slot down.
+
+    NOTE:
+    -----
+        - the resolution is `tick` seconds. Timers fire up to one tick late
+        - timers beyond the range of the highest level are parked in its
+          furthest slot and moved down until they are due
+        - callbacks run on the event loop and must not block
+    """
+    def __init__(self, tick: float = 0.1, levels: int = 4):
+        self.log = logging.getLogger(self.__class__.__name__)
+        self.tick = tick
+        self.levels = levels
+        self._wheels: List[List[Set[Timer]]] = [[set() for _ in range(SLOTS)] for _ in range(levels)]
+        self._current = 0
+        self._started = time.monotonic()
+        self._task: asyncio.Task | None = None
+        self.active = 0
+        self.fired = 0
+
+    def _now_tick(self) -> int:
+        return int((time.monotonic() - self._started) / self.tick)
+
+    def schedule(self, seconds: float, callback: Callable[..., Any], *args: Any) -> Timer:
+        """calls `callback(*args)` in `seconds` seconds"""
+        timer = Timer(self._current + max(1, round(seconds / self.tick)), callback, args)
+        self._insert(timer)
+        self.active += 1
+        return timer
+
+    def cancel(self, timer: Timer) -> None:
+        if timer._slot is not None:
+            timer._slot.discard(timer)
+            timer._slot = None
+            self.active -= 1
+
+    def reschedule(self, timer: Timer, seconds: float) -> Timer:
+        """moves `timer` to `seconds` from now. Works for fired and cancelled timers as well"""
+        self.cancel(timer)
+        timer.expires = self._current + max(1, round(seconds / self.tick))
+        self._insert(timer)
+        self.active += 1
+        return timer
+
+    def _insert(self, timer: Timer) -> None:
+        delta = max(1, timer.expires - self._current)
+        level = 0
+        while level < self.levels - 1 and delta >= 1 << (SLOT_BITS * (level + 1)):
+            level += 1
+        # the highest level can hold up to 64 of its slots
+        expires = min(timer.expires, self._current + (1 << (SLOT_BITS * (level + 1))) - 1)
+        slot = self._wheels[level][(expires >> (SLOT_BITS * level)) & SLOT_MASK]
+        slot.add(timer)
+        timer._slot = slot
+
+    def advance(self, ticks: int = 1) -> int:
+        """
+        moves the wheel `ticks` ticks forward and fires everything due
+
+        Returns:
+        --------
+        `int`
+            the amount of fired timers
+        """
+        fired = 0
+        for _ in range(ticks):
+            self._current += 1
+            # move the timers of the next higher slot down when a wheel wraps around
+            level = 0
+            while level < self.levels - 1 and (self._current >> (SLOT_BITS * level)) & SLOT_MASK == 0:
+                level += 1
+                self._cascade(level)
+            slot = self._wheels[0][self._current & SLOT_MASK]
+            if not slot:
+                continue
+            due = list(slot)
+            slot.clear()
+            for timer in due:
+                timer._slot = None
+                if timer.expires > self._current:
+                    # parked timer which is not due yet
+                    self._insert(timer)
+                    continue
+                self.active -= 1
+                fired += 1
+                try:
+                    timer.callback(*timer.args)
+                except Exception:
+                    self.log.exception("timer callback failed")
+        self.fired += fired
+        return fired
+
+    def _cascade(self, level: int) -> None:
+        slot = self._wheels[level][(self._current >> (SLOT_BITS * level)) & SLOT_MASK]
+        if not slot:
+            return
+        timers = list(slot)
+        slot.clear()
+        for timer in timers:
+            self._insert(timer)
+
+    def start(self) -> None:
+        """starts ticking on the running loop"""
+        if self._task is None or self._task.done():
+            self._started = time.monotonic() - self._current * self.tick
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.tick)
+            # catches up with ticks missed while the loop was blocked
+            behind = self._now_tick() - self._current
+            if behind > 0:
+                self.advance(behind)
@@ -0,0 +1,111 @@
+"""Stateless, HMAC signed session tokens"""
+from typing import *
+import base64
+from collections import OrderedDict
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import time
+
+from .singleton import Singleton
+from .config import config_section
+
+__all__: Final[Sequence[str]] = ["TokenSigner"]
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+class TokenSigner(metaclass=Singleton):
+    """
+    Issues and verifies tokens of the form `<payload>.<signature>`.
+    The payload is base64url encoded JSON with the user id, the username
+    and the expiry timestamp. Verification is fully local - no database involved.
+
+    NOTE:
+    -----
+        - the secret is read from the `REVERSI_TOKEN_SECRET` environment variable
+          or `auth.secret`. Without one a random secret is generated, which
+          invalidates all tokens on restart and is not shared between workers
+        - recently verified tokens are kept in a small LRU
+    """
+    def __init__(
+        self, 
+        secret: bytes | None = None, 
+        ttl: int | None = None, 
+        cache_size: int | None = None
+    ):
+        self.log = logging.getLogger(self.__class__.__name__)
+        section = config_section("auth")
+        if secret is None:
+            configured = os.environ.get("REVERSI_TOKEN_SECRET") or section.get("secret")
+            if configured:
+                secret = str(configured).encode()
+            else:
+                self.log.warning("No token secret configured - using a random one")
+                secret = secrets.token_bytes(32)
+        self._secret = secret
+        self.ttl: int = ttl or int(section.get("token_ttl", 24 * 60 * 60))
+        self.cache_size: int = cache_size or int(section.get("token_cache_size", 4096))
+        self.require_token: bool = bool(section.get("require_token", False))
+        # token -> claims
+        self._verified: OrderedDict[str, Dict[str, Any]] = OrderedDict()
+
+    def _sign(self, payload: str) -> str:
+        digest = hmac.new(self._secret, payload.encode(), hashlib.sha256).digest()
+        return _b64encode(digest)
+
+    def issue(self, user_id: int, username: str) -> str:
+        """
+        Returns:
+        --------
+        `str`
+            a signed token which expires in `ttl` seconds
+        """
+        claims = {
+            "user_id": user_id,
+            "username": username,
+            "exp": int(time.time()) + self.ttl,
+        }
+        payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode())
+        return f"{payload}.{self._sign(payload)}"
+
+    def verify(self, token: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns:
+        --------
+        `Dict[str, Any] | None`
+            the claims of the token or None if it's invalid or expired
+        """
+        now = time.time()
+        claims = self._verified.get(token)
+        if claims is not None:
+            if claims["exp"] > now:
+                self._verified.move_to_end(token)
+                return claims
+            del self._verified[token]
+            return None
+
+        payload, _, signature = token.partition(".")
+        # bytes - compare_digest raises TypeError for str with non-ASCII characters
+        if not signature or not hmac.compare_digest(signature.encode(), self._sign(payload).encode()):
+            return None
+        try:
+            claims = json.loads(_b64decode(payload))
+        except (ValueError, json.JSONDecodeError):
+            return None
+        if not isinstance(claims, dict) or claims.get("exp", 0) <= now:
+            return None
+
+        self._verified[token] = claims
+        if len(self._verified) > self.cache_size:
+            self._verified.popitem(last=False)
+        return claims
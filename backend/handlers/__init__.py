@@ -1,2 +1,5 @@
 from .login import *
-from .register import *
\ No newline at end of file
+from .register import *
+from .metrics import *
+from .health import *
+from .admin import *
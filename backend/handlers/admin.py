@@ -0,0 +1,134 @@
+from typing import *
+import hmac
+import math
+import os
+import time
+import logging
+import tornado
+from tornado.web import RequestHandler
+from tornado.websocket import WebSocketHandler
+
+from core import config_section
+from core.profiler import SamplingProfiler, MemoryTracer, count_instances
+from impl.reversi.game import Game, Board, Chip
+
+__all__ = ["AdminProfileHandler", "AdminTracemallocHandler", "AdminObjectsHandler"]
+
+log = logging.getLogger(__name__)
+# one profile at a time for the whole process
+profiler = SamplingProfiler()
+memory_tracer = MemoryTracer()
+# upper limit for the duration of one profile
+MAX_PROFILE_SECONDS = 300
+# lower limit for the duration and the sampling interval - a smaller interval
+# would keep the GIL busy with sampling
+MIN_PROFILE_INTERVAL = 0.001
+
+
+def admin_token() -> str | None:
+    """the token of the `REVERSI_ADMIN_TOKEN` environment variable or `admin.token`"""
+    token = os.environ.get("REVERSI_ADMIN_TOKEN")
+    if token:
+        return token
+    return config_section("admin").get("token") or None
+
+
+class AdminHandler(RequestHandler):
+    """
+    Base for the debugging endpoints. Every request needs the header
+    `Authorization: Bearer <admin token>`. Without a configured token
+    the endpoints don't exist (404).
+    """
+    def prepare(self):
+        token = admin_token()
+        if token is None:
+            self.send_error(404)
+            return
+        header = self.request.headers.get("Authorization", "")
+        scheme, _, given = header.partition(" ")
+        if scheme.lower() != "bearer" or not hmac.compare_digest(given.encode(), token.encode()):
+            self.set_status(401)
+            self.set_header("WWW-Authenticate", "Bearer")
+            self.finish({"status": 401, "message": "Unauthorized"})
+            return
+        log.info("admin request %s %s from %s", self.request.method, self.request.uri, self.request.remote_ip)
+
+    async def send_file(self, filename: str, lines: Iterable[str], chunk_lines: int = 500) -> None:
+        """streams `lines` as a downloadable text file"""
+        self.set_header("Content-Type", "text/plain; charset=utf-8")
+        self.set_header("Content-Disposition", f'attachment; filename="{filename}"')
+        for i, line in enumerate(lines, 1):
+            self.write(line)
+            if i % chunk_lines == 0:
+                await self.flush()
+        self.finish()
+
+
+class AdminProfileHandler(AdminHandler):
+    """
+    GET `?seconds=N&interval=S`: profiles for N seconds and returns the stacks in collapsed format.
+        Both are clamped to `MIN_PROFILE_INTERVAL`, `seconds` to `MAX_PROFILE_SECONDS`
+    DELETE: stops a running profile early - the waiting GET returns what was sampled so far
+    """
+    async def get(self):
+        if profiler.running:
+            self.set_status(409)
+            return self.write({"status": 409, "message": "A profile is already running"})
+        try:
+            seconds = float(self.get_argument("seconds", "10"))
+            interval = float(self.get_argument("interval", str(profiler.interval)))
+        except ValueError:
+            seconds = interval = math.nan
+        if not (math.isfinite(seconds) and math.isfinite(interval)):
+            self.set_status(400)
+            return self.write({"status": 400, "message": "`seconds` and `interval` have to be numbers"})
+        seconds = min(max(seconds, MIN_PROFILE_INTERVAL), MAX_PROFILE_SECONDS)
+        profiler.interval = max(interval, MIN_PROFILE_INTERVAL)
+        await profiler.run(seconds)
+        header = (
+            f"# {profiler.sample_count} samples every {profiler.interval}s over {profiler.duration:.2f}s\n"
+        )
+        await self.send_file(
+            f"profile-{int(time.time())}.collapsed",
+            [header, *profiler.collapsed()],
+        )
+
+    async def delete(self):
+        running = profiler.running
+        # the waiting GET joins the sampling thread
+        profiler.request_stop()
+        self.write({"status": 200, "data": {"stopped": running}})
+
+
+class AdminTracemallocHandler(AdminHandler):
+    """
+    POST `?frames=N`: starts tracing allocations
+    GET `?limit=N&compare=1`: takes a snapshot and returns the top allocation sites
+    DELETE: stops tracing
+    """
+    async def post(self):
+        memory_tracer.start(int(self.get_argument("frames", "10")))
+        self.write({"status": 200, "data": {"tracing": True}})
+
+    async def get(self):
+        if not memory_tracer.tracing:
+            self.set_status(409)
+            return self.write({"status": 409, "message": "tracemalloc is not started"})
+        limit = int(self.get_argument("limit", "50"))
+        compare = self.get_argument("compare", "0") in ("1", "true")
+        # the snapshot is taken before the first byte is written
+        report = list(memory_tracer.snapshot(limit, compare))
+        await self.send_file(f"tracemalloc-{int(time.time())}.txt", report)
+
+    async def delete(self):
+        memory_tracer.stop()
+        self.write({"status": 200, "data": {"tracing": False}})
+
+
+class AdminObjectsHandler(AdminHandler):
+    """GET: live instances of the game objects and websocket handlers"""
+    async def get(self):
+        self.write({
+            "status": 200,
+            "data": count_instances((Game, Board, Chip, WebSocketHandler))
+        })
@@ -0,0 +1,68 @@
+from typing import *
+import tornado
+from tornado.web import RequestHandler
+
+from core import Database, LoopMonitor
+from impl.session_manager import GameSessionManager, LobbySessionManager
+from impl.reversi.game_manager import ReversiManager
+
+__all__ = ["HealthHandler", "ReadyHandler"]
+
+
+def health_report() -> Dict[str, Any]:
+    """the current state of this worker"""
+    db = Database()
+    return {
+        "loop": LoopMonitor().stats(),
+        "sockets": {
+            "game": len(GameSessionManager.websockets),
+            "lobby": len(LobbySessionManager.websockets),
+        },
+        "games": ReversiManager.live_games(),
+        "database": {
+            "connected": db.is_connected,
+            **db.admission.stats(),
+        },
+    }
+
+
+class HealthHandler(RequestHandler):
+    """liveness - answers as long as the event loop runs at all"""
+    def __init__(self, *args, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._set_headers()
+
+    def _set_headers(self):
+        self.set_header('Access-Control-Allow-Origin', '*')
+        self.set_header('Access-Control-Allow-Methods', 'GET, OPTIONS')
+        self.set_header('Access-Control-Allow-Headers', 'Content-Type')
+
+    async def get(self):
+        self.write({
+            "status": 200,
+            "data": health_report()
+        })
+
+
+class ReadyHandler(HealthHandler):
+    """
+    readiness - 503 while the loop lags or the database pool is saturated,
+    so a load balancer stops routing new clients to this worker
+    """
+    async def get(self):
+        monitor = LoopMonitor()
+        max_lag = monitor.max_lag
+        max_saturation = monitor.max_saturation
+        report = health_report()
+        reasons: List[str] = []
+        if report["loop"]["lag_p95"] > max_lag:
+            reasons.append(f"event loop lag p95 above {max_lag}s")
+        if report["database"]["saturation"] > max_saturation:
+            reasons.append(f"database pool saturation above {max_saturation}")
+        if reasons:
+            self.set_status(503)
+        self.write({
+            "status": 503 if reasons else 200,
+            "reasons": reasons,
+            "data": report
+        })
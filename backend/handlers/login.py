@@ -1,11 +1,10 @@
 from typing import *
-import bcrypt
 import tornado
 from tornado import httputil
 from tornado.websocket import WebSocketHandler
 from tornado.web import RequestHandler, Application
 
-from core import Table
+from core import Table, PasswordHasher, ServiceOverloaded, TokenSigner
 
 
 class LoginHandler(RequestHandler):
@@ -19,6 +18,20 @@ class LoginHandler(RequestHandler):
         self.set_header('Access-Control-Allow-Headers', 'Content-Type')
 
     async def post(self):
+        # password hashing and the database reject work when they are saturated
+        try:
+            await self._login()
+        except ServiceOverloaded as e:
+            self.set_status(503)
+            self.set_header("Retry-After", str(int(e.retry_after)))
+            return self.write(
+                {
+                    "status": 503,
+                    "message": "Server is busy, try again later"
+                }
+            )
+
+    async def _login(self):
         password = self.get_argument("password")
         username = self.get_argument("username")
         table = Table("profile.full")
@@ -30,7 +43,7 @@ class LoginHandler(RequestHandler):
                     "message": "Username or password is incorrect"
                 }
             )
-        is_pw_correct = bcrypt.checkpw(password.encode(), record["password_hash"].encode())
+        is_pw_correct = await PasswordHasher().checkpw(password, record["password_hash"])
         if not is_pw_correct:
             return self.write(
                 {
@@ -42,6 +55,6 @@ class LoginHandler(RequestHandler):
             {
                 "status": 200,
                 "message": "Login successful",
-                "token": "test"
+                "token": TokenSigner().issue(record["information_id"], record["username"])
             }
         )
\ No newline at end of file
@@ -0,0 +1,16 @@
+from typing import *
+
+from core import Metrics
+from .admin import AdminHandler
+
+__all__ = ["MetricsHandler"]
+
+
+class MetricsHandler(AdminHandler):
+    """
+    serves all registered metrics in Prometheus text format.
+    Needs the admin token like the other debugging endpoints - the labels contain SQL templates
+    """
+    async def get(self):
+        self.set_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.write(Metrics.render())
@@ -1,11 +1,10 @@
 from typing import *
-import bcrypt
 import tornado
 from tornado import httputil
 from tornado.websocket import WebSocketHandler
 from tornado.web import RequestHandler, Application
 
-from core import Table
+from core import Table, PasswordHasher, ServiceOverloaded, TokenSigner
 
 class SignInHandler(RequestHandler):
     def __init__(self, *args, **kwargs: Any) -> None:
@@ -18,41 +17,58 @@ class SignInHandler(RequestHandler):
         self.set_header('Access-Control-Allow-Headers', 'Content-Type')
 
     async def post(self):
-        password = self.get_argument("password")
-        username = self.get_argument("username")
-        table = Table("profile.full")
-        record = await table.select_row(where={"username": username})
-        if record:
+        # password hashing and the database reject work when they are saturated
+        try:
+            await self._register()
+        except ServiceOverloaded as e:
+            self.set_status(503)
+            self.set_header("Retry-After", str(int(e.retry_after)))
             return self.write(
                 {
-                    "status": 400,
-                    "message": "Username already exists",
-                    "username": record["username"],
-                    "password_hash": record["password_hash"],
-                    "salt": record["salt"]
-
+                    "status": 503,
+                    "message": "Server is busy, try again later"
                 }
             )
 
-        salt: bytes = bcrypt.gensalt()
-        hashed_password: bytes = bcrypt.hashpw(password.encode(), salt)
-        table = Table("profile.information")
-        record = await table.insert(values={"username": username})
-        user_id = record[0]["id"]
-        table = Table("profile.authentication")
-        record = await table.insert(
-            values={
-                "user_id": user_id, 
-                "salt": salt.decode(), 
-                "password_hash": hashed_password.decode()
+    def _username_exists(self, username: str):
+        return self.write(
+            {
+                "status": 400,
+                "message": "Username already exists",
+                "username": username,
             }
         )
+
+    async def _register(self):
+        password = self.get_argument("password")
+        username = self.get_argument("username")
+        table = Table("profile.information")
+        # bcrypt is the expensive part - taken usernames don't get a hash
+        if await table.select_row(where={"username": username}, select="id"):
+            return self._username_exists(username)
+        salt, hashed_password = await PasswordHasher().hashpw(password)
+        # information + authentication are inserted with one statement.
+        # A username registered in the meantime inserts nothing
+        records = await table.insert_cascade(
+            values={"username": username},
+            child="profile.authentication",
+            child_values={
+                "salt": salt, 
+                "password_hash": hashed_password
+            },
+            link=("user_id", "id"),
+            on_conflict="DO NOTHING",
+            returning="user_id",
+        )
+        if not records:
+            return self._username_exists(username)
+        user_id = records[0]["user_id"]
         self.write(
             {
                 "status": 200,
-                "token": "test",
-                "salt": salt.decode(),
-                "hashed_password": hashed_password.decode(),
+                "token": TokenSigner().issue(user_id, username),
+                "salt": salt,
+                "hashed_password": hashed_password,
                 "password": password,
                 "username": username,
                 "user_id": user_id
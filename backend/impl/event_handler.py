@@ -1,23 +1,77 @@
 from typing import *
+import asyncio
+import hmac
 import json
-from tornado.websocket import WebSocketHandler
+import time
+from tornado.websocket import WebSocketHandler, WebSocketClosedError
 import random
 import traceback
 from enum import Enum
 import logging
 
+from core import TokenSigner, ServiceOverloaded
 from impl.session_manager import GameSessionManager, LobbySessionManager, SessionManager
 
 from impl.reversi.game import Game, GameOverEvent
 from impl.reversi.game_manager import ReversiManager
+from impl.event_metrics import EventMetrics, UNKNOWN_EVENT, frame_size, get_event_metrics
+from impl.session_actors import SessionActors
+from impl.lobby_presence import LobbyPresence
 
 
-logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-
 class ResponseType(Enum):
     SESSION = 0
     PLAYER = 1
 
+
+def authenticate_event(event: Dict[str, Any]) -> Tuple[bool, Optional[Dict[str, Any]]]:
+    """
+    Verifies the optional `token` of an event locally.
+
+    Returns:
+    --------
+    `Tuple[bool, Dict[str, Any] | None]`
+        whether the event is allowed and the claims of the token
+    """
+    signer = TokenSigner()
+    token = event.get("token")
+    if token is None:
+        return not signer.require_token, None
+    if not isinstance(token, str):
+        return False, None
+    claims = signer.verify(token)
+    return claims is not None, claims
+
+
+def unauthorized_response(event: Dict[str, Any]) -> Tuple[Dict[str, Any], ResponseType]:
+    return {
+        "event": event["event"],
+        "status": 401,
+        "message": "Invalid or expired token",
+        "data": {
+            "session": event.get("session")
+        }
+    }, ResponseType.PLAYER
+
+def _on_clock_timeout(session: str, player: int, turn: int) -> None:
+    asyncio.get_running_loop().create_task(_expire_game(session, player, turn))
+
+
+async def _expire_game(session: str, player: int, turn: int) -> None:
+    """ends a game whose clock ran out and tells both players"""
+    try:
+        event = await SessionActors.run(session, ReversiManager.expire, session, player, turn)
+    except ServiceOverloaded:
+        # the session is busy with moves - the clock is restarted by them
+        return
+    if event is None:
+        return
+    GameSessionManager.broadcast(session, event)
+
+
+ReversiManager.timeout_handlers.append(_on_clock_timeout)
+
+
 class EventManager:
     """
     Manages the Reversi Events and sends notifications to the listeners
@@ -27,25 +81,68 @@ class EventManager:
         self.session_manager = session_manager
         self.event_handler = event_handler
         self.listeners: Dict[str, List[Callable[..., Awaitable]]] = {}
+        # stats hook - None if `metrics.events` is disabled
+        self.metrics: EventMetrics | None = get_event_metrics()
 
     def add_listener(self, event_type, listener: Callable[..., Awaitable]):
         if event_type not in self.listeners:
             self.listeners[event_type] = []
         self.listeners[event_type].append(listener)
 
-    async def notify_listeners(self, event_type: str, event: Dict[str, Any]):
-        if event_type in self.listeners:
-            for listener in self.listeners[event_type]:
-                response, scope = await listener(event)
-                if scope == ResponseType.SESSION:
-                    self.log.debug("respond to session")
-                    for ws in self.session_manager.get_session_ws(event["session"]):
-                        self.log.debug(f"Sending response to {ws._id}: {response}")
-                        ws.write_message(response)
-                else:
-                    self.log.debug(f"Sending response to {self.event_handler.ws._id}: {response}")
-                    self.event_handler.ws.write_message(response)
-
+    async def notify_listeners(self, event_type: str, event: Dict[str, Any], size: int = 0):
+        """
+        Calls the listeners of `event_type` and sends their responses.
+        A response is encoded once and the string is sent to all receivers.
+        With `EventManager.metrics` the `EventStats` of `event_type` are recorded.
+        The latency of the whole dispatch is only measured for every
+        `EventMetrics.sample_every`th event of a type
+        """
+        listeners = self.listeners.get(event_type)
+        stats = None
+        start: float | None = None
+        fanout = 0
+        bytes_out = 0
+        if self.metrics is not None:
+            stats = self.metrics.get(event_type if listeners else UNKNOWN_EVENT)
+            stats.received += 1
+            stats.bytes_in += size
+            if stats.received % self.metrics.sample_every == 0:
+                start = time.monotonic()
+        if not listeners:
+            return
+        for listener in listeners:
+            response, scope = await listener(event)
+            if scope == ResponseType.SESSION:
+                self.log.debug("respond to session")
+                message = self.session_manager.publish(event["session"], response)
+                receivers = list(self.session_manager.get_session_ws(event["session"]))
+            else:
+                message = json.dumps(response)
+                receivers = [self.event_handler.ws]
+            for ws in receivers:
+                self.log.debug("Sending response to %s: %s", ws._id, response)
+                self._write(ws, message)
+            fanout += len(receivers)
+            # the messages are JSON with escaped non-ASCII characters - characters are bytes
+            bytes_out += len(message) * len(receivers)
+        if stats is not None:
+            stats.responses += len(listeners)
+            stats.fanout += fanout
+            stats.bytes_out += bytes_out
+            if start is not None:
+                end = time.monotonic()
+                stats.latency.observe(end - start, end)
+
+    def _write(self, ws: WebSocketHandler, message: str) -> None:
+        """sends to a websocket of the session. One which is closing is skipped - its seat may be resumed"""
+        if ws is self.event_handler.ws:
+            # the sender learns about its own closed connection in `on_message`
+            ws.write_message(message)
+            return
+        try:
+            ws.write_message(message)
+        except WebSocketClosedError:
+            self.log.debug("websocket %s is closed", ws._id)
 
 
 class event:
@@ -71,6 +168,8 @@ class ReversiEventHandler:
         self.event_manager.add_listener("ChipPlacedEvent", self.chip_placed_event)
         self.event_manager.add_listener("GameReadyEvent", self.game_ready_event)
         self.event_manager.add_listener("SurrenderEvent", self.surrender_event)
+        self.event_manager.add_listener("SessionResumeEvent", self.session_resume_event)
+        self.event_manager.add_listener("SessionWatchEvent", self.session_watch_event)
 
 
     async def dispatch(self, event):
@@ -78,6 +177,7 @@ class ReversiEventHandler:
 
 
     async def message_receive(self, event):
+        size = frame_size(event)
         # decrypt event
         try:
             event = json.loads(event)
@@ -89,10 +189,14 @@ class ReversiEventHandler:
                 "message": "Invalid JSON Syntax",
                 "data": event
             }
-        
+        await self.event_receive(event, size)
+
+
+    async def event_receive(self, event: Dict[str, Any], size: int = 0):
+        """handles an already decoded event"""
         event_type = event["event"]
-        self.log.debug(f"Event received: {event_type}",)
-        await self.event_manager.notify_listeners(event_type, event)
+        self.log.debug("Event received: %s", event_type)
+        await self.event_manager.notify_listeners(event_type, event, size)
 
 
     async def turn_made(self):
@@ -117,6 +221,19 @@ class ReversiEventHandler:
                 }
             }, ResponseType.PLAYER
         winner_id = GameSessionManager.get_opponent(session, player_id)
+        try:
+            # ordered after the moves which are already queued
+            await SessionActors.run(session, ReversiManager.finish, session)
+        except ServiceOverloaded:
+            return {
+                "event": "SurrenderEvent",
+                "status": 503,
+                "message": "Server is busy, try again later",
+                "data": {
+                    "session": session
+                }
+            }, ResponseType.PLAYER
+        ReversiManager.stop_clock(session)
         return GameOverEvent(
             winner=winner_id,
             title=f"Game Over",
@@ -128,7 +245,21 @@ class ReversiEventHandler:
         """
         check if session is valid and return status
         """
+        is_authenticated, claims = authenticate_event(event)
+        if not is_authenticated:
+            return unauthorized_response(event)
+        self.ws._user = claims
         session = event["session"]
+        if GameSessionManager.is_closed(session):
+            # a new player would replace the running game - a dropped player has to resume
+            return {
+                "event": "SessionJoinEvent",
+                "status": 409,
+                "message": "Game is running - resume your seat instead",
+                "data": {
+                    "session": session
+                }
+            }, ResponseType.PLAYER
         if GameSessionManager.validate_session(session):
             player_id = self.ws._id
             GameSessionManager.add_session_ws(session, self.ws)
@@ -142,7 +273,19 @@ class ReversiEventHandler:
                 }
             }, ResponseType.PLAYER
         
+        self.ws._session = session
         self.ws._custom_id = event["data"]["custom_id"]
+        seat = GameSessionManager.add_seat(session, self.ws)
+        # the key is only for this player - it's needed to resume the seat after a disconnect
+        self.ws.write_message(json.dumps({
+            "event": "SessionSeatEvent",
+            "status": 200,
+            "session": session,
+            "data": {
+                "player_id": player_id,
+                "resume_key": seat.key,
+            },
+        }))
         if len(GameSessionManager.sessions[session]) >= 2:
             # game ready
             game = ReversiManager.create_game(
@@ -150,6 +293,8 @@ class ReversiEventHandler:
                 player_id_2=GameSessionManager.sessions[session][1]._id,
                 session=session
             )
+            # generating the valid moves is game logic - it runs on the session's shard
+            current_player, valid_moves, board = await SessionActors.run(session, self._game_ready_state, game)
             # dispatch game ready event
             await self.dispatch(
                 event=json.dumps({
@@ -165,11 +310,9 @@ class ReversiEventHandler:
                             "id": GameSessionManager.sessions[session][1]._id,
                             "custom_id": GameSessionManager.sessions[session][1]._custom_id,
                         },
-                        "current_player_id": game.current_player,
-                        "current_player_valid_moves": [
-                            chip.to_json() for chip in game.get_valid_moves(game.current_player)
-                        ],
-                        "board": game.board.to_json(),
+                        "current_player_id": current_player,
+                        "current_player_valid_moves": valid_moves,
+                        "board": board,
                     },
                 })
             )
@@ -184,6 +327,165 @@ class ReversiEventHandler:
         }, ResponseType.SESSION
 
 
+    async def session_resume_event(self, event) -> Tuple[Dict[str, Any], ResponseType]:
+        """
+        Continues the seat of a disconnected player on this websocket.
+        The events after `data.last_seq` are sent along if they are still
+        buffered (mode `delta`), otherwise the current state (mode `snapshot`).
+        The snapshot contains at least everything up to `data.seq`.
+        """
+        is_authenticated, claims = authenticate_event(event)
+        if not is_authenticated:
+            return unauthorized_response(event)
+        session = event.get("session")
+        data = event.get("data") or {}
+        seat = GameSessionManager.get_seat(session, data.get("player_id"))
+        if seat is None:
+            return {
+                "event": "SessionResumeEvent",
+                "status": 404,
+                "message": "Seat does not exist",
+                "data": {
+                    "session": session
+                }
+            }, ResponseType.PLAYER
+        key = data.get("resume_key")
+        # bytes - compare_digest raises TypeError for str with non-ASCII characters
+        if not isinstance(key, str) or not hmac.compare_digest(key.encode(), seat.key.encode()):
+            return {
+                "event": "SessionResumeEvent",
+                "status": 401,
+                "message": "Invalid resume key",
+                "data": {
+                    "session": session
+                }
+            }, ResponseType.PLAYER
+        self.ws._user = claims
+        GameSessionManager.attach_ws(session, seat, self.ws)
+        log = GameSessionManager.logs.get(session)
+        last_seq = data.get("last_seq")
+        missed = log.since(last_seq) if log is not None and isinstance(last_seq, int) else None
+        response = {
+            "event": "SessionResumeEvent",
+            "status": 200,
+            "session": session,
+            "data": {
+                "player_id": seat.player_id,
+                "custom_id": seat.custom_id,
+                "seq": log.seq if log is not None else 0,
+            },
+        }
+        if missed is not None:
+            response["data"]["mode"] = "delta"
+            response["data"]["events"] = missed
+        else:
+            response["data"]["mode"] = "snapshot"
+            try:
+                response["data"]["snapshot"] = await self._snapshot(session)
+            except ServiceOverloaded:
+                response["data"]["snapshot"] = None
+        # sent after this response, which is written as soon as the listener returns
+        asyncio.get_running_loop().call_soon(GameSessionManager.broadcast, session, {
+            "event": "PlayerResumedEvent",
+            "status": 200,
+            "session": session,
+            "data": {
+                "player_id": seat.player_id,
+            },
+        })
+        return response, ResponseType.PLAYER
+
+
+    async def session_watch_event(self, event) -> Tuple[Dict[str, Any], ResponseType]:
+        """
+        Subscribes to the events of a session without taking a seat - for spectators.
+        Answers with the current state, later events follow after `data.seq`.
+        """
+        is_authenticated, claims = authenticate_event(event)
+        if not is_authenticated:
+            return unauthorized_response(event)
+        session = event.get("session")
+        if not GameSessionManager.validate_session(session):
+            return {
+                "event": "SessionWatchEvent",
+                "status": 404,
+                "message": "Session does not exist",
+                "data": {
+                    "session": session
+                }
+            }, ResponseType.PLAYER
+        if self.ws._session not in (None, session):
+            return {
+                "event": "SessionWatchEvent",
+                "status": 409,
+                "message": "Connection belongs to another session",
+                "data": {
+                    "session": session
+                }
+            }, ResponseType.PLAYER
+        if GameSessionManager.is_player(session, self.ws):
+            # it already gets every event - a subscription would double them
+            return {
+                "event": "SessionWatchEvent",
+                "status": 409,
+                "message": "Connection has a seat in this session",
+                "data": {
+                    "session": session
+                }
+            }, ResponseType.PLAYER
+        self.ws._user = claims
+        GameSessionManager.subscribe(session, self.ws)
+        log = GameSessionManager.logs.get(session)
+        seq = log.seq if log is not None else 0
+        try:
+            snapshot = await self._snapshot(session)
+        except ServiceOverloaded:
+            snapshot = None
+        return {
+            "event": "SessionWatchEvent",
+            "status": 200,
+            "session": session,
+            "data": {
+                "seq": seq,
+                "snapshot": snapshot,
+            },
+        }, ResponseType.PLAYER
+
+
+    async def _snapshot(self, session: str) -> Dict[str, Any]:
+        """the players and the state of the game"""
+        players = [
+            {"id": seat.player_id, "custom_id": seat.custom_id, "connected": seat.connected}
+            for seat in GameSessionManager.seats.get(session, {}).values()
+        ]
+        game = ReversiManager.get_game(session)
+        if game is None:
+            return {"players": players, "game": None}
+        return {"players": players, "game": await SessionActors.run(session, self._snapshot_state, game)}
+
+
+    @classmethod
+    def _snapshot_state(cls, game: Game) -> Dict[str, Any]:
+        current_player, valid_moves, board = cls._game_ready_state(game)
+        return {
+            "current_player_id": current_player,
+            "current_player_valid_moves": valid_moves,
+            "board": board,
+            "turn": game.board.turn,
+            "game_over": game.game_over,
+        }
+
+
+    @staticmethod
+    def _game_ready_state(game: Game) -> Tuple[int, List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """the current player, its valid moves and the board"""
+        current_player = game.current_player
+        return (
+            current_player,
+            [chip.to_json() for chip in game.get_valid_moves(current_player)],
+            game.board.to_json(),
+        )
+
     async def game_ready_event(self, event: Dict[str, Any]) -> Tuple[Dict[str, Any], ResponseType]:
         return event, ResponseType.SESSION
 
@@ -199,12 +501,26 @@ class ReversiEventHandler:
                 "session": event["session"]
             }, ResponseType.PLAYER
         try:
-            response = game.place_chip(
+            # ordered per session and off the event loop
+            response, turn = await SessionActors.run(
+                event["session"],
+                ReversiManager.place_chip,
+                game,
                 row=event["data"]["row"],
                 column=event["data"]["column"],
                 player=event["user_id"]
             )
+            # the next turn starts now
+            ReversiManager.schedule_turn(event["session"], turn)
             return response, ResponseType.SESSION
+        except ServiceOverloaded:
+            return {
+                "event": "ChipPlacedEvent",
+                "status": 503,
+                "message": "Server is busy, try again later",
+                "data": event["data"],
+                "session": event["session"]
+            }, ResponseType.PLAYER
         except Exception as e:
             error = traceback.format_exc()
             try:
@@ -228,6 +544,7 @@ class LobbyEventHandler:
         self.event_manager.add_listener("SessionJoinEvent", self.session_join_event)
         self.event_manager.add_listener("SessionLeaveEvent", self.session_leave_event)
         self.event_manager.add_listener("GameStartEvent", self.game_start_event)
+        self.event_manager.add_listener("PresenceSnapshotEvent", self.presence_snapshot_event)
 
 
     async def dispatch(self, event):
@@ -235,6 +552,7 @@ class LobbyEventHandler:
 
 
     async def message_receive(self, event):
+        size = frame_size(event)
         # decrypt event
         try:
             event = json.loads(event)
@@ -248,29 +566,38 @@ class LobbyEventHandler:
             }
         
         event_type = event["event"]
-        self.log.debug(f"Event received: {event_type}", )
-        await self.event_manager.notify_listeners(event_type, event)
+        self.log.debug("Event received: %s", event_type)
+        await self.event_manager.notify_listeners(event_type, event, size)
     
 
     async def session_join_event(self, event) -> Tuple[Dict[str, Any], ResponseType]:
         """
-        check if session is valid and return status
+        check if session is valid and return status.
+        The joining user gets all members, the others a `PresenceEvent`
         """
+        is_authenticated, claims = authenticate_event(event)
+        if not is_authenticated:
+            return unauthorized_response(event)
+        self.ws._user = claims
         session = event["session"]
         if LobbySessionManager.validate_session(session):
             user_id = self.ws._id
+            self.ws._custom_id = event["custom_id"]
+            self.ws._token = event.get("token")
+            self.ws._upgrade = bool(event.get("upgrade", False))
             LobbySessionManager.add_session_ws(session, self.ws)
             self.ws.set_session(session)
+            LobbyPresence.joined(session, user_id)
             return {
                 "event": "SessionJoinEvent",
                 "status": 200,
                 "session": session,
                 "data": {
                     "user_id": user_id,
-                    "all_users": [ws._id for ws in LobbySessionManager.get_session_ws(session)],
+                    "all_users": LobbyPresence.snapshot(session),
                     "custom_id": event["custom_id"]
                 },
-            }, ResponseType.SESSION
+            }, ResponseType.PLAYER
         else:
             return {
                 "event": "SessionJoinEvent",
@@ -299,30 +626,93 @@ class LobbyEventHandler:
 
     async def session_leave_event(self, event: Dict[str, Any]) -> Tuple[Dict[str, Any], ResponseType]:
         """
-        create a session and return the session id
+        the user leaves the lobby. The others get it with the next `PresenceEvent`
         """
-        # removing of websocket is done in main
+        session = event["session"]
+        if self.ws._session == session:
+            LobbySessionManager.remove_session_ws(session, self.ws)
+            LobbyPresence.left(session, self.ws._id)
+            self.ws._session = None
         return {
             "event": "SessionLeaveEvent",
             "status": 200,
-            "session": event["session"],
+            "session": session,
             "data": {
-                "session": event["session"],
-                "all_users": [ws._id for ws in LobbySessionManager.get_session_ws(event["session"])]
+                "session": session,
             }
-        }, ResponseType.SESSION
+        }, ResponseType.PLAYER
+
+
+    async def presence_snapshot_event(self, event: Dict[str, Any]) -> Tuple[Dict[str, Any], ResponseType]:
+        """all members of the lobby"""
+        session = event.get("session")
+        if not LobbySessionManager.validate_session(session):
+            return {
+                "event": "PresenceSnapshotEvent",
+                "status": 404,
+                "message": "Session does not exist",
+                "data": {
+                    "session": session
+                }
+            }, ResponseType.PLAYER
+        all_users = LobbyPresence.snapshot(session)
+        return {
+            "event": "PresenceSnapshotEvent",
+            "status": 200,
+            "session": session,
+            "data": {
+                "all_users": all_users,
+                "count": len(all_users),
+            }
+        }, ResponseType.PLAYER
     
 
     async def game_start_event(self, event: Dict[str, Any]) -> Tuple[Dict[str, Any], ResponseType]:
-        LobbySessionManager.transfer_to_game(event["session"])
-        self.log.debug(f"Game codes: {GameSessionManager.sessions}")
+        session = event["session"]
+        LobbySessionManager.transfer_to_game(session)
+        self.log.debug("Game codes: %s", GameSessionManager.sessions)
+        # lobby connections which asked for it become the game connections of the first two players
+        upgraded = [ws for ws in LobbySessionManager.get_session_ws(session) if ws._upgrade][:2]
+        if upgraded:
+            # after the GameStartEvent, which is sent as soon as this listener returns
+            asyncio.get_running_loop().create_task(self._upgrade(session, upgraded))
         return {
             "event": "GameStartEvent",
             "status": 200,
-            "session": event["session"]
+            "session": session,
+            "data": {
+                "upgraded_users": [ws._id for ws in upgraded],
+            },
         }, ResponseType.SESSION
 
 
+    async def _upgrade(self, session: str, websockets: List[WebSocketHandler]) -> None:
+        """
+        Turns lobby connections into game connections and joins them to the
+        game session - in lobby order, as if they had sent a `SessionJoinEvent` to `/reversi`
+        """
+        for ws in websockets:
+            if ws.ws_connection is None:
+                # closed in the meantime
+                continue
+            LobbySessionManager.remove_session_ws(session, ws, pass_check=True)
+            LobbyPresence.left(session, ws._id)
+            if LobbySessionManager.websockets.get(ws._id) is ws:
+                del LobbySessionManager.websockets[ws._id]
+            ws._id = GameSessionManager.get_ws_id()
+            GameSessionManager.websockets[ws._id] = ws
+            ws._session = None
+            ws._game = True
+            ws.event_handler = ReversiEventHandler(ws)
+            join = {"event": "SessionJoinEvent", "session": session, "data": {"custom_id": ws._custom_id}}
+            if ws._token is not None:
+                join["token"] = ws._token
+            try:
+                await ws.event_handler.dispatch(json.dumps(join))
+            except WebSocketClosedError:
+                GameSessionManager.close_ws(ws)
+
+
 # if __name__ == "__main__":
 #     handler = EventHandler()
 #     handler.message_receive({"event": "TurnMadeEvent", "data": "test"})
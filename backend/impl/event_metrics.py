@@ -0,0 +1,88 @@
+"""Per event type counters, handler latency, payload sizes and fan-out of the EventManager"""
+from typing import *
+from functools import lru_cache
+
+from core import Metrics, config_section
+from core.metrics import RollingHistogram, format_labels
+
+__all__: Final[Sequence[str]] = ["EventStats", "EventMetrics", "frame_size", "get_event_metrics"]
+
+# label for event types without listeners - clients choose the type,
+# hence unknown types must not create new series
+UNKNOWN_EVENT: Final[str] = "unknown"
+
+
+def frame_size(message: Union[str, bytes]) -> int:
+    """the payload bytes of a websocket message - `len` of a str counts characters"""
+    if isinstance(message, str) and not message.isascii():
+        return len(message.encode())
+    return len(message)
+
+
+class EventStats:
+    """
+    plain counters and one latency histogram per event type.
+    `python -m benchmarks.bench_engine --filter notify` measures their cost per event
+    """
+    __slots__ = ("received", "bytes_in", "responses", "bytes_out", "fanout", "latency")
+
+    def __init__(self) -> None:
+        self.received = 0
+        self.bytes_in = 0
+        self.responses = 0
+        self.bytes_out = 0
+        # amount of websockets a response was sent to
+        self.fanout = 0
+        self.latency = RollingHistogram()
+
+
+class EventMetrics:
+    """
+    the `EventStats` of every event type, rendered on `/metrics`.
+    The latency is measured for every `sample_every`th event of a type -
+    two clock reads and a histogram update cost more than all counters together
+    """
+    def __init__(self, sample_every: int = 8) -> None:
+        self.sample_every = max(1, sample_every)
+        self._stats: Dict[str, EventStats] = {}
+
+    def get(self, event_type: str) -> EventStats:
+        stats = self._stats.get(event_type)
+        if stats is None:
+            stats = self._stats[event_type] = EventStats()
+        return stats
+
+    def render(self) -> Iterator[str]:
+        items = list(self._stats.items())
+        counters = [
+            ("reversi_events_received_total", "received", "Received events"),
+            ("reversi_event_bytes_received_total", "bytes_in", "Payload bytes of received events"),
+            ("reversi_event_responses_total", "responses", "Responses created by listeners"),
+            ("reversi_event_bytes_sent_total", "bytes_out", "Payload bytes sent, counted per websocket"),
+            ("reversi_event_fanout_total", "fanout", "Websockets responses were sent to"),
+        ]
+        for name, attribute, help in counters:
+            yield f"# HELP {name} {help}"
+            yield f"# TYPE {name} counter"
+            for event_type, stats in items:
+                yield f"{name}{format_labels({'event': event_type})} {getattr(stats, attribute)}"
+        yield "# HELP reversi_event_handler_seconds Latency of the event dispatch, sampled"
+        yield "# TYPE reversi_event_handler_seconds histogram"
+        for event_type, stats in items:
+            yield from stats.latency.render("reversi_event_handler_seconds", {"event": event_type})
+
+
+@lru_cache(maxsize=None)
+def get_event_metrics() -> Optional[EventMetrics]:
+    """
+    Returns:
+    --------
+    `EventMetrics | None`
+        the metrics or None if `metrics.events` is disabled in the config
+    """
+    section = config_section("metrics")
+    if not section.get("events", False):
+        return None
+    metrics = EventMetrics(int(section.get("latency_sample_every", 8)))
+    Metrics.register("events", metrics.render)
+    return metrics
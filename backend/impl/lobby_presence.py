@@ -0,0 +1,90 @@
+"""Lobby presence as coalesced join / leave deltas"""
+from typing import *
+import asyncio
+import logging
+
+from core import config_section
+from impl.session_manager import LobbySessionManager
+
+__all__: Final[Sequence[str]] = ["LobbyPresence"]
+
+
+class LobbyPresence:
+    """
+    Collects who joined and left a lobby and sends it to its members as one
+    `PresenceEvent` per `lobby.presence_interval` seconds:
+
+        {"event": "PresenceEvent", "session": ..., "data": {"joined": [...], "left": [...], "count": n}}
+
+    A member gets the full list once, with its own `SessionJoinEvent`, and
+    can ask for it again with a `PresenceSnapshotEvent` - e.g. when `count`
+    does not match its list.
+
+    NOTE:
+    -----
+        - with an interval of 0 the changes of one loop iteration are still sent together
+        - an id is only in the last of `joined` and `left` it was added to.
+          `left` is applied after `joined`
+    """
+    interval: float = 0.05
+    # session -> (joined ids, left ids) since the last flush
+    _pending: Dict[str, Tuple[List[int], List[int]]] = {}
+    _configured: bool = False
+    log = logging.getLogger("LobbyPresence")
+
+    @classmethod
+    def _load_config(cls) -> None:
+        if cls._configured:
+            return
+        cls._configured = True
+        cls.interval = float(config_section("lobby").get("presence_interval", cls.interval))
+
+    @classmethod
+    def _changes(cls, session: str) -> Tuple[List[int], List[int]]:
+        changes = cls._pending.get(session)
+        if changes is None:
+            cls._load_config()
+            changes = cls._pending[session] = ([], [])
+            loop = asyncio.get_running_loop()
+            if cls.interval > 0:
+                loop.call_later(cls.interval, cls._flush, session)
+            else:
+                loop.call_soon(cls._flush, session)
+        return changes
+
+    @classmethod
+    def joined(cls, session: str, user_id: int) -> None:
+        joined, left = cls._changes(session)
+        if user_id in left:
+            left.remove(user_id)
+        joined.append(user_id)
+
+    @classmethod
+    def left(cls, session: str, user_id: int) -> None:
+        # always announced - a member could have received this join
+        # already with its `SessionJoinEvent` snapshot
+        joined, left = cls._changes(session)
+        if user_id in joined:
+            joined.remove(user_id)
+        left.append(user_id)
+
+    @classmethod
+    def snapshot(cls, session: str) -> List[int]:
+        """the ids of all members"""
+        return [ws._id for ws in LobbySessionManager.get_session_ws(session)]
+
+    @classmethod
+    def _flush(cls, session: str) -> None:
+        joined, left = cls._pending.pop(session, ([], []))
+        if not joined and not left:
+            return
+        LobbySessionManager.broadcast(session, {
+            "event": "PresenceEvent",
+            "status": 200,
+            "session": session,
+            "data": {
+                "joined": joined,
+                "left": left,
+                "count": len(LobbySessionManager.get_session_ws(session)),
+            },
+        })
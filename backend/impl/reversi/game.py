@@ -3,11 +3,14 @@ from typing import *
 from typing import Any
 import random
 import json
+import logging
 from pprint import pprint
 from enum import Enum
 
 from utils import Grid
 
+log = logging.getLogger(__name__)
+
 
 class RuleError(Exception):
     """raised when a rule is violated"""
@@ -253,7 +256,10 @@ class Board:
         # get theoretical changes or raise RuleError
         theoretically_affacted_chips: List[Chip] = []
         try:
-            theoretically_affacted_chips = self.theoretically_drop_chip(chip, player, True)
+            # dumping the board is only worth it when someone reads it
+            theoretically_affacted_chips = self.theoretically_drop_chip(
+                chip, player, log.isEnabledFor(logging.DEBUG)
+            )
         except RuleError as e:
             raise e
         
@@ -470,7 +476,7 @@ class Board:
                 post_chip: bool = False
                 first_own_chip_found: bool = False
                 if print_:
-                    print(f"row: {row}")
+                    log.debug("row: %s", row)
                 for chip in row:
                     if post_chip:
                         if chip.owner_id is None:
@@ -499,11 +505,11 @@ class Board:
                             temp_affected_chips.add(chip)
                         
         if print_:
-            print(f"affected chips: {affected_chips}")
-            for row in self._board:
-                for chip in row:
-                    print(f"{chip.field_name}: {chip.owner_id}", end="\t")
-                print()
+            log.debug("affected chips: %s", affected_chips)
+            log.debug("board:\n%s", "\n".join(
+                "\t".join(f"{chip.field_name}: {chip.owner_id}" for chip in row)
+                for row in self._board
+            ))
         return list(affected_chips)
     
     @property
@@ -1,26 +1,167 @@
 from typing import *
+import asyncio
+import logging
 
 from api import State
 
-from impl.reversi.game import Game
+from core import config_section
+from core.timer_wheel import TimerWheel, Timer
+from impl.reversi.game import Game, GameOverEvent
 
 states: Dict[str, Game] = {}
 
 
 
 class ReversiManager:
-    """manages the open instances of games"""
+    """
+    manages the open instances of games and their clocks.
+
+    All clocks share one `TimerWheel`. Every game has one timer which
+    is moved after each turn:
+        - `clock.move_seconds` > 0: the player on turn loses when it runs out
+        - otherwise `clock.abandon_seconds`: the game ends without winner
+          when nobody moved for that long
+    """
     _games: Dict[str, Game] = {}
+    _clock: TimerWheel | None = None
+    # session -> the timer of its current turn
+    _timers: Dict[str, Timer] = {}
+    # called with (session, player, turn) when a clock ran out - they end the game with `expire`
+    timeout_handlers: List[Callable[[str, int, int], Any]] = []
+    move_seconds: float = 0.0
+    abandon_seconds: float = 0.0
+    log = logging.getLogger("ReversiManager")
         
     @classmethod
     def create_game(cls, player_id_1: int, player_id_2: int, session: str) -> Game:
         """creates a new game and returns its id"""
         game = Game.DEFAULT(player_id_1, player_id_2)
         cls._games[session] = game
+        cls.schedule_turn(session, cls.turn_of(game))
         return game
+
+    @staticmethod
+    def turn_of(game: Game) -> Optional[Tuple[int, int]]:
+        """
+        Returns:
+        --------
+        `Tuple[int, int] | None`
+            the player on turn and the turn - None if the game is over
+
+        NOTE:
+        -----
+            - read it on the thread which changes the game (the session's shard)
+        """
+        if game.game_over:
+            return None
+        return game.current_player, game.board.turn
+
+    @classmethod
+    def place_chip(
+        cls, game: Game, row: int, column: int, player: int
+    ) -> Tuple[Dict[str, Any], Optional[Tuple[int, int]]]:
+        """`Game.place_chip` and the `turn_of` the game after it - runs on the shard of the session"""
+        response = game.place_chip(row, column, player)
+        return response, cls.turn_of(game)
+
+    @classmethod
+    def finish(cls, session: str) -> None:
+        """ends the game of `session`, e.g. after a surrender - runs on the shard of the session"""
+        game = cls._games.get(session)
+        if game is not None:
+            game.game_over = True
+
+    @classmethod
+    def get_clock(cls) -> TimerWheel | None:
+        """the shared clock, started on first use. None without a running loop"""
+        if cls._clock is None:
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                return None
+            section = config_section("clock")
+            cls.move_seconds = float(section.get("move_seconds", 0))
+            cls.abandon_seconds = float(section.get("abandon_seconds", 0))
+            cls._clock = TimerWheel(tick=float(section.get("tick", 0.1)))
+            cls._clock.start()
+        return cls._clock
+
+    @classmethod
+    def schedule_turn(cls, session: str, turn: Optional[Tuple[int, int]]) -> None:
+        """
+        (re)starts the clock of the turn which is about to be played.
+        Has to be called after every move. Stops the clock of finished games
+
+        Args:
+        -----
+        session : `str`
+            the session of the game
+        turn : `Tuple[int, int] | None`
+            the `turn_of` the game, taken right after the move. The game itself
+            may already be changed by the next move on the shard
+        """
+        clock = cls.get_clock()
+        if clock is None:
+            return
+        if turn is None or not (cls.move_seconds or cls.abandon_seconds):
+            cls.stop_clock(session)
+            return
+        seconds = cls.move_seconds or cls.abandon_seconds
+        args = (session, *turn)
+        timer = cls._timers.get(session)
+        if timer is None:
+            cls._timers[session] = clock.schedule(seconds, cls._on_timeout, *args)
+        else:
+            timer.args = args
+            clock.reschedule(timer, seconds)
+
+    @classmethod
+    def stop_clock(cls, session: str) -> None:
+        timer = cls._timers.pop(session, None)
+        if timer is not None and cls._clock is not None:
+            cls._clock.cancel(timer)
+
+    @classmethod
+    def _on_timeout(cls, session: str, player: int, turn: int) -> None:
+        cls._timers.pop(session, None)
+        for handler in list(cls.timeout_handlers):
+            handler(session, player, turn)
+
+    @classmethod
+    def expire(cls, session: str, player: int, turn: int) -> Optional[Dict[str, Any]]:
+        """
+        Ends the game because the clock of `turn` ran out.
+
+        Returns:
+        --------
+        `Dict[str, Any] | None`
+            the GameOverEvent or None if the turn was played in the meantime
+        """
+        game = cls._games.get(session)
+        if game is None or game.game_over or game.board.turn != turn or game.current_player != player:
+            return None
+        game.game_over = True
+        if cls.move_seconds:
+            winner = game.player_2 if player == game.player_1 else game.player_1
+            event = GameOverEvent(
+                winner=winner,
+                title="Time is up",
+                reason=f"Player {player} ran out of time",
+            )
+        else:
+            event = GameOverEvent(
+                winner=None,
+                title="Game abandoned",
+                reason=f"Nobody moved for {cls.abandon_seconds:.0f} seconds",
+            )
+        return event.to_dict()
         
     @classmethod
     def get_game(cls, session: str) -> Optional[Game]:
         """returns the game with the given id"""
         return cls._games.get(session, None)
-    
\ No newline at end of file
+
+    @classmethod
+    def live_games(cls) -> int:
+        """the amount of games which are not over yet"""
+        return sum(1 for game in list(cls._games.values()) if not game.game_over)
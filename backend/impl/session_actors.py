@@ -0,0 +1,160 @@
+"""Runs the game logic of every session in order on a thread pinned to the session"""
+from typing import *
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import logging
+import zlib
+
+from core import Metrics, ServiceOverloaded, config_section
+from core.metrics import format_labels
+
+__all__: Final[Sequence[str]] = ["SessionActors", "SessionMailbox", "MailboxFull"]
+
+T = TypeVar("T")
+
+
+class MailboxFull(ServiceOverloaded):
+    """raised when a session has too many unprocessed events"""
+
+
+class SessionMailbox:
+    """
+    The queued work of one session. One item runs at a time, in the order
+    it was submitted - no matter from which websocket it came.
+    """
+    def __init__(self, session: str, shard: int, executor: ThreadPoolExecutor, max_size: int):
+        self.session = session
+        self.shard = shard
+        self.executor = executor
+        self.max_size = max_size
+        self._items: Deque[Tuple[Callable[[], Any], asyncio.Future]] = deque()
+        self._draining = False
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    @property
+    def idle(self) -> bool:
+        return not self._items and not self._draining
+
+    def submit(self, func: Callable[[], T]) -> "asyncio.Future[T]":
+        if len(self._items) >= self.max_size:
+            raise MailboxFull(f"{len(self._items)} events of session {self.session} waiting")
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._items.append((func, future))
+        if not self._draining:
+            self._draining = True
+            loop.create_task(self._drain())
+        return future
+
+    async def _drain(self) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            while self._items:
+                func, future = self._items.popleft()
+                if future.done():
+                    # the caller gave up
+                    continue
+                try:
+                    result = await loop.run_in_executor(self.executor, func)
+                except Exception as e:
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    if not future.done():
+                        future.set_result(result)
+        finally:
+            self._draining = False
+            SessionActors._release(self)
+
+
+class SessionActors:
+    """
+    Gives every session a `SessionMailbox` and runs its work on one of
+    `shards` single threaded executors. The shard is chosen by the session code,
+    hence a session always runs on the same thread and never concurrently.
+
+    A slow board only delays the sessions of its own shard. The loop thread
+    keeps answering other sessions - Python hands the GIL over to it at least
+    every `sys.getswitchinterval()` seconds.
+
+    NOTE:
+    -----
+        - with `actors.shards: 0` the work runs inline on the event loop
+        - mailboxes are dropped as soon as they are empty
+    """
+    _mailboxes: Dict[str, SessionMailbox] = {}
+    _shards: List[ThreadPoolExecutor] | None = None
+    max_mailbox: int = 64
+    log = logging.getLogger("SessionActors")
+
+    @classmethod
+    def _get_shards(cls) -> List[ThreadPoolExecutor]:
+        if cls._shards is None:
+            section = config_section("actors")
+            shards = int(section.get("shards", 4))
+            cls.max_mailbox = int(section.get("max_mailbox", cls.max_mailbox))
+            cls._shards = [
+                ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"session-shard-{i}")
+                for i in range(shards)
+            ]
+            Metrics.register("session_actors", cls.render)
+            cls.log.info("running game logic on %s shards", shards)
+        return cls._shards
+
+    @staticmethod
+    def shard_of(session: str, shards: int) -> int:
+        """stable across restarts, unlike `hash`"""
+        return zlib.crc32(session.encode()) % shards
+
+    @classmethod
+    async def run(cls, session: str, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """
+        Runs `func(*args, **kwargs)` after all earlier work of `session`.
+
+        Raises:
+        -------
+        MailboxFull:
+            if `max_mailbox` events of the session are waiting
+        """
+        call = partial(func, *args, **kwargs)
+        shards = cls._get_shards()
+        if not shards:
+            return call()
+        mailbox = cls._mailboxes.get(session)
+        if mailbox is None:
+            shard = cls.shard_of(session, len(shards))
+            mailbox = SessionMailbox(session, shard, shards[shard], cls.max_mailbox)
+            cls._mailboxes[session] = mailbox
+        return await mailbox.submit(call)
+
+    @classmethod
+    def _release(cls, mailbox: SessionMailbox) -> None:
+        if mailbox.idle and cls._mailboxes.get(mailbox.session) is mailbox:
+            del cls._mailboxes[mailbox.session]
+
+    @classmethod
+    def stats(cls) -> Dict[int, Dict[str, int]]:
+        """sessions and waiting events per shard"""
+        shards: Dict[int, Dict[str, int]] = {
+            i: {"sessions": 0, "waiting": 0} for i in range(len(cls._shards or []))
+        }
+        for mailbox in list(cls._mailboxes.values()):
+            shards[mailbox.shard]["sessions"] += 1
+            shards[mailbox.shard]["waiting"] += len(mailbox)
+        return shards
+
+    @classmethod
+    def render(cls) -> Iterator[str]:
+        stats = cls.stats()
+        yield "# HELP reversi_session_shard_waiting Events waiting in the mailboxes of a shard"
+        yield "# TYPE reversi_session_shard_waiting gauge"
+        for shard, values in stats.items():
+            yield f"reversi_session_shard_waiting{format_labels({'shard': str(shard)})} {values['waiting']}"
+        yield "# HELP reversi_session_shard_sessions Sessions with queued work on a shard"
+        yield "# TYPE reversi_session_shard_sessions gauge"
+        for shard, values in stats.items():
+            yield f"reversi_session_shard_sessions{format_labels({'shard': str(shard)})} {values['sessions']}"
@@ -0,0 +1,122 @@
+"""Many game sessions over one websocket connection"""
+from typing import *
+import json
+import logging
+
+from tornado.websocket import WebSocketHandler, WebSocketClosedError
+
+from core import config_section
+from impl.event_handler import ReversiEventHandler
+from impl.event_metrics import frame_size
+from impl.session_manager import GameSessionManager
+
+__all__: Final[Sequence[str]] = ["SessionChannel", "ChannelMux"]
+
+
+class SessionChannel:
+    """
+    One session of a multiplexed connection. To the session managers and
+    event handlers it looks like a game websocket of its own - what is
+    written to it is tagged with the session and sent over the shared connection.
+    """
+    __slots__ = ("mux", "channel", "_id", "_session", "_custom_id", "_user", "closed", "event_handler")
+
+    def __init__(self, mux: "ChannelMux", channel: str):
+        self.mux = mux
+        # the session code the client used to open the channel
+        self.channel = channel
+        self._id = GameSessionManager.get_ws_id()
+        GameSessionManager.websockets[self._id] = self
+        self._session: str | None = None
+        self._custom_id: Any = None
+        self._user: Dict[str, Any] | None = None
+        self.closed = False
+        self.event_handler = ReversiEventHandler(self)  # type: ignore[arg-type]
+
+    def write_message(self, message: str | Dict[str, Any], binary: bool = False) -> Any:
+        if self.closed:
+            raise WebSocketClosedError()
+        if not isinstance(message, str):
+            message = json.dumps(message)
+        # the message is already encoded - it's embedded, not decoded again
+        return self.mux.ws.write_message(f'{{"channel":{json.dumps(self.channel)},"message":{message}}}')
+
+    def close(self, code: int | None = None, reason: str | None = None) -> None:
+        """ends the channel, the connection stays open"""
+        if self.closed:
+            return
+        self.closed = True
+        self.mux.forget(self)
+        GameSessionManager.close_ws(self)
+
+
+class ChannelMux:
+    """
+    The channels of one connection. Incoming events are routed by their
+    `session`, the first event of an unknown session opens a channel for it
+    (usually a `SessionJoinEvent`, `SessionResumeEvent` or `SessionWatchEvent`).
+    A channel which did not end up in a session is dropped again.
+
+    Outgoing frames are `{"channel": <session>, "message": <event>}`.
+    `{"event": "ChannelCloseEvent", "session": <session>}` leaves a session.
+
+    NOTE:
+    -----
+        - `mux.max_channels` limits the channels of one connection
+    """
+    max_channels: int = 256
+    _configured: bool = False
+
+    def __init__(self, ws: WebSocketHandler):
+        self.log = logging.getLogger(self.__class__.__name__)
+        self.ws = ws
+        self.channels: Dict[str, SessionChannel] = {}
+        if not ChannelMux._configured:
+            ChannelMux._configured = True
+            ChannelMux.max_channels = int(config_section("mux").get("max_channels", ChannelMux.max_channels))
+
+    def _error(self, status: int, message: str, data: Any = None) -> None:
+        self.ws.write_message(json.dumps({
+            "event": "ErrorEvent",
+            "status": status,
+            "message": message,
+            "data": data,
+        }))
+
+    async def receive(self, message: str | bytes) -> None:
+        try:
+            event = json.loads(message)
+        except json.JSONDecodeError:
+            self._error(400, "Invalid JSON Syntax", message if isinstance(message, str) else None)
+            return
+        session = event.get("session") if isinstance(event, dict) else None
+        if not isinstance(session, str) or "event" not in event:
+            self._error(400, "Every event needs `event` and `session`", event)
+            return
+        channel = self.channels.get(session)
+        if event["event"] == "ChannelCloseEvent":
+            if channel is not None:
+                channel.close()
+            self.ws.write_message(json.dumps({
+                "channel": session,
+                "message": {"event": "ChannelCloseEvent", "status": 200, "session": session},
+            }))
+            return
+        if channel is None:
+            if len(self.channels) >= self.max_channels:
+                self._error(429, f"Not more than {self.max_channels} sessions per connection", {"session": session})
+                return
+            channel = self.channels[session] = SessionChannel(self, session)
+        await channel.event_handler.event_receive(event, frame_size(message))
+        if channel._session is None and not channel.closed:
+            # the join failed
+            channel.close()
+
+    def forget(self, channel: SessionChannel) -> None:
+        if self.channels.get(channel.channel) is channel:
+            del self.channels[channel.channel]
+
+    def close(self) -> None:
+        """the connection is gone - every channel is closed like a websocket of its own"""
+        for channel in list(self.channels.values()):
+            channel.close()
@@ -1,8 +1,15 @@
 from typing import *
+from collections import deque
 from datetime import datetime
-from tornado.websocket import WebSocketHandler
+from tornado.websocket import WebSocketHandler, WebSocketClosedError
+import json
 import random
 import logging
+import secrets
+
+from core import config_section
+from core.timer_wheel import Timer
+from impl.reversi.game_manager import ReversiManager
 
 
 class SessionManager:
@@ -42,7 +49,8 @@ class SessionManager:
             return
         
         if ws:
-            cls.sessions[session].remove(ws)
+            if ws in cls.sessions[session]:
+                cls.sessions[session].remove(ws)
         else:
             cls.sessions[session] = []
 
@@ -50,7 +58,7 @@ class SessionManager:
             return
         
         if len(cls.sessions[session]) == 0:
-            cls.log.debug(f"Delete session {session}")
+            cls.log.debug("Delete session %s", session)
             del cls.sessions[session]
 
     @classmethod
@@ -58,6 +66,21 @@ class SessionManager:
         if session not in cls.sessions:
             return []
         return cls.sessions[session]
+
+    @classmethod
+    def publish(cls, session: str, event: Dict[str, Any]) -> str:
+        """encodes an event which is sent to the whole session"""
+        return json.dumps(event)
+
+    @classmethod
+    def broadcast(cls, session: str, event: Dict[str, Any]) -> None:
+        """sends `event` to all websockets of the session which are still open"""
+        message = cls.publish(session, event)
+        for ws in list(cls.get_session_ws(session)):
+            try:
+                ws.write_message(message)
+            except WebSocketClosedError:
+                pass
     
     @classmethod
     def create_session(cls, session: str | None = None) -> str:
@@ -74,7 +97,7 @@ class SessionManager:
                 raise Exception(f"Session {session} already exists")
             return cls.create_session()
         cls.sessions[code] = []
-        cls.log.debug(f"Created session {code}")
+        cls.log.debug("Created session %s", code)
         return code
     
     @classmethod
@@ -84,11 +107,78 @@ class SessionManager:
 
 
 
+class SessionLog:
+    """
+    The outbound events of a game session, numbered from 1 by their `seq` key.
+    The last `size` events are kept to be replayed to reconnecting players.
+    """
+    __slots__ = ("seq", "events")
+
+    def __init__(self, size: int):
+        self.seq = 0
+        self.events: Deque[Dict[str, Any]] = deque(maxlen=size)
+
+    def append(self, event: Dict[str, Any]) -> str:
+        self.seq += 1
+        event["seq"] = self.seq
+        self.events.append(event)
+        return json.dumps(event)
+
+    def since(self, seq: int) -> Optional[List[Dict[str, Any]]]:
+        """the events after `seq` or None if some of them are no longer buffered"""
+        missed = self.seq - seq
+        if missed < 0 or missed > len(self.events):
+            return None
+        if missed == 0:
+            return []
+        return list(self.events)[-missed:]
+
+
+class Seat:
+    """the place of a player in a game session, kept while the player reconnects"""
+    __slots__ = ("player_id", "custom_id", "key", "timer")
+
+    def __init__(self, player_id: int, custom_id: Any):
+        self.player_id = player_id
+        self.custom_id = custom_id
+        # proves that a new websocket belongs to this player
+        self.key = secrets.token_urlsafe(16)
+        # runs while the player is disconnected
+        self.timer: Timer | None = None
+
+    @property
+    def connected(self) -> bool:
+        return self.timer is None
+
+
 class GameSessionManager(SessionManager):
+    """
+    Game sessions number their events and keep the last `resume.replay_size`
+    of them in a `SessionLog`. A player who loses the connection keeps their
+    `Seat` for `resume.seconds` and can continue with a `SessionResumeEvent`.
+    """
     websockets: Dict[int, WebSocketHandler] = {}
     sessions: Dict[str, List[WebSocketHandler]] = {}
+    logs: Dict[str, SessionLog] = {}
+    # session -> player id -> seat
+    seats: Dict[str, Dict[int, Seat]] = {}
+    # session -> websockets which receive its events without playing
+    subscribers: Dict[str, List[WebSocketHandler]] = {}
+    # player ids of held seats - not given to new websockets until the seat is released
+    reserved_ids: Set[int] = set()
+    replay_size: int = 64
+    resume_seconds: float = 60.0
+    _configured: bool = False
     log = logging.getLogger("GameSessionManager")
     
+    @classmethod
+    def get_ws_id(cls) -> int:
+        """an id which is used neither by a websocket nor by a held seat"""
+        code = super().get_ws_id()
+        if code in cls.reserved_ids:
+            return cls.get_ws_id()
+        return code
+
     @classmethod
     def create_session(cls, session: str | None = None) -> str:
         """
@@ -104,7 +194,7 @@ class GameSessionManager(SessionManager):
                 raise Exception(f"Session {session} already exists")
             return cls.create_session()
         cls.sessions[code] = []
-        cls.log.debug(f"Created session {code}")
+        cls.log.debug("Created session %s", code)
         return code
     
     @classmethod
@@ -122,15 +212,186 @@ class GameSessionManager(SessionManager):
         pass_check: bool
             Whether to pass the check to remove empty sessions
         """
-        print("removing session ws")
+        cls.log.debug("removing session ws")
         LobbySessionManager.remove_session(session)
         super().remove_session_ws(session, ws, pass_check)
+        if session not in cls.sessions:
+            cls.logs.pop(session, None)
+            cls.subscribers.pop(session, None)
+            for seat in cls.seats.pop(session, {}).values():
+                cls._stop_seat_timer(seat)
+                cls.reserved_ids.discard(seat.player_id)
+
+    @classmethod
+    def get_session_ws(cls, session: str) -> List[WebSocketHandler]:
+        """the players and subscribers of a session"""
+        players = super().get_session_ws(session)
+        subscribers = cls.subscribers.get(session)
+        if not subscribers:
+            return players
+        return players + subscribers
+
+    @classmethod
+    def is_closed(cls, session: str) -> bool:
+        """whether a game is running or a seat is held for a disconnected player - nobody can join then"""
+        game = ReversiManager.get_game(session)
+        if game is not None and not game.game_over:
+            return True
+        return any(not seat.connected for seat in cls.seats.get(session, {}).values())
+
+    @classmethod
+    def is_player(cls, session: str, ws: WebSocketHandler) -> bool:
+        """whether `ws` is connected to `session` as player or its user has a seat"""
+        return ws in cls.sessions.get(session, []) or cls.get_seat(session, ws._id) is not None
+
+    @classmethod
+    def subscribe(cls, session: str, ws: WebSocketHandler) -> None:
+        """
+        `ws` receives the events of `session` without taking a seat.
+        Does nothing for players - they receive them already
+        """
+        if cls.is_player(session, ws):
+            return
+        subscribers = cls.subscribers.setdefault(session, [])
+        if ws not in subscribers:
+            subscribers.append(ws)
+        ws._session = session
+
+    @classmethod
+    def _load_config(cls) -> None:
+        if cls._configured:
+            return
+        cls._configured = True
+        section = config_section("resume")
+        cls.replay_size = int(section.get("replay_size", cls.replay_size))
+        cls.resume_seconds = float(section.get("seconds", cls.resume_seconds))
+
+    @classmethod
+    def publish(cls, session: str, event: Dict[str, Any]) -> str:
+        """numbers `event`, keeps it for replays and encodes it"""
+        log = cls.logs.get(session)
+        if log is None:
+            cls._load_config()
+            log = cls.logs[session] = SessionLog(cls.replay_size)
+        return log.append(event)
+
+    @classmethod
+    def add_seat(cls, session: str, ws: WebSocketHandler) -> Seat:
+        """gives the player of `ws` a seat which can be resumed"""
+        seat = Seat(ws._id, getattr(ws, "_custom_id", None))
+        cls.seats.setdefault(session, {})[seat.player_id] = seat
+        return seat
+
+    @classmethod
+    def get_seat(cls, session: str, player_id: int) -> Optional[Seat]:
+        return cls.seats.get(session, {}).get(player_id)
+
+    @classmethod
+    def detach_ws(cls, session: str, ws: WebSocketHandler) -> bool:
+        """
+        Removes a closed websocket from its session but keeps the seat of
+        its player for `resume_seconds`.
+
+        Returns:
+        --------
+        `bool`
+            False if the websocket has no seat which can be resumed
+        """
+        seat = cls.get_seat(session, ws._id)
+        game = ReversiManager.get_game(session)
+        clock = ReversiManager.get_clock()
+        if seat is None or not seat.connected or game is None or game.game_over or clock is None:
+            return False
+        cls._load_config()
+        if ws in cls.sessions.get(session, []):
+            cls.sessions[session].remove(ws)
+        seat.timer = clock.schedule(cls.resume_seconds, cls._release_seat, session, seat.player_id)
+        cls.reserved_ids.add(seat.player_id)
+        cls.log.debug("player %s of session %s disconnected", seat.player_id, session)
+        cls.broadcast(session, {
+            "event": "PlayerDisconnectedEvent",
+            "status": 200,
+            "session": session,
+            "data": {
+                "player_id": seat.player_id,
+                "resume_seconds": cls.resume_seconds,
+            },
+        })
+        return True
+
+    @classmethod
+    def close_ws(cls, ws: WebSocketHandler) -> None:
+        """forgets a closed websocket. Its seat is kept while the game is running"""
+        # a resumed seat may already use this id for another websocket
+        if cls.websockets.get(ws._id) is ws:
+            del cls.websockets[ws._id]
+        session = ws._session
+        if session is None:
+            return
+        ws._session = None
+        subscribers = cls.subscribers.get(session, [])
+        if ws in subscribers:
+            subscribers.remove(ws)
+            if not subscribers:
+                del cls.subscribers[session]
+            return
+        if cls.detach_ws(session, ws):
+            cls.log.debug("websocket %s left session %s, its seat is kept", ws._id, session)
+        else:
+            cls.remove_session_ws(session, ws)
+            cls.log.debug("websocket %s removed from session %s", ws._id, session)
+
+    @classmethod
+    def attach_ws(cls, session: str, seat: Seat, ws: WebSocketHandler) -> None:
+        """
+        Gives `ws` the identity of the player of `seat`. A websocket
+        which still holds the seat is replaced.
+        """
+        for old in list(cls.sessions.get(session, [])):
+            if old._id == seat.player_id and old is not ws:
+                cls.sessions[session].remove(old)
+                # its `on_close` must not detach the seat again
+                old._session = None
+                old.close()
+        cls._stop_seat_timer(seat)
+        cls.reserved_ids.discard(seat.player_id)
+        if cls.websockets.get(ws._id) is ws:
+            del cls.websockets[ws._id]
+        ws._id = seat.player_id
+        ws._custom_id = seat.custom_id
+        ws._session = session
+        cls.websockets[ws._id] = ws
+        cls.sessions.setdefault(session, []).append(ws)
+
+    @classmethod
+    def _stop_seat_timer(cls, seat: Seat) -> None:
+        clock = ReversiManager.get_clock()
+        if seat.timer is not None and clock is not None:
+            clock.cancel(seat.timer)
+        seat.timer = None
+
+    @classmethod
+    def _release_seat(cls, session: str, player_id: int) -> None:
+        """the player did not come back in time. Drops the session when nobody is left"""
+        seats = cls.seats.get(session, {})
+        seat = seats.pop(player_id, None)
+        if seat is None:
+            return
+        cls.reserved_ids.discard(player_id)
+        cls.log.debug("seat of player %s in session %s released", player_id, session)
+        if not cls.sessions.get(session) and all(not s.connected for s in seats.values()):
+            ReversiManager.stop_clock(session)
+            cls.remove_session_ws(session, None)
 
     @classmethod
     def get_opponent(cls, session: str, player_id: int) -> int | None:
         """
         Returns the opponent of a player in a session
         """
+        seats = cls.seats.get(session)
+        if seats and len(seats) == 2 and player_id in seats:
+            # still known while the opponent is disconnected
+            return next(id_ for id_ in seats if id_ != player_id)
         if session not in cls.sessions:
             return None
         if len(cls.sessions[session]) != 2:
@@ -10,13 +10,18 @@ import random
 import json 
 import traceback
 import logging
-logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
 from utils import Grid
-from handlers import LoginHandler, SignInHandler
+from handlers import (
+    LoginHandler, SignInHandler, MetricsHandler, HealthHandler, ReadyHandler,
+    AdminProfileHandler, AdminTracemallocHandler, AdminObjectsHandler
+)
 from impl.session_manager import GameSessionManager, LobbySessionManager
 from impl.event_handler import ReversiEventHandler, LobbyEventHandler
-from core import Database, get_config
+from impl.session_channels import ChannelMux
+from impl.lobby_presence import LobbyPresence
+from core import Database, LoopMonitor, get_config
+from core.log_config import setup_logging
 
 config = get_config()
 
@@ -27,6 +32,8 @@ config = get_config()
 class GameWebSocket(WebSocketHandler):
     _id: int = -1
     _session: str|None = None
+    # claims of the verified session token
+    _user: Dict[str, Any] | None = None
 
     def __init__(self, *args, **kwargs: Any) -> None:
         self.log = logging.getLogger(self.__class__.__name__)
@@ -39,10 +46,10 @@ class GameWebSocket(WebSocketHandler):
     def open(self):
         self._id = GameSessionManager.get_ws_id()
         GameSessionManager.websockets[self._id] = self
-        self.log.debug(f"WebSocket with id {self._id} opened")
+        self.log.debug("WebSocket with id %s opened", self._id)
 
     async def on_message(self, message):
-        self.log.debug(f"Game Message received from {self._id}: {message}")
+        self.log.debug("Game Message received from %s: %s", self._id, message)
         try:
             await self.event_handler.dispatch(message)
         except tornado.websocket.WebSocketClosedError:
@@ -50,11 +57,8 @@ class GameWebSocket(WebSocketHandler):
             self.on_close()
 
     def on_close(self):
-        del GameSessionManager.websockets[self._id]
-        if self._session is not None:
-            GameSessionManager.remove_session_ws(self._session, self._id)
-            self.log.debug(f"WebSocket with id {self._id} removed from session {self._session}")
-        self.log.debug(f"WebSocket with id {self._id} closed")
+        GameSessionManager.close_ws(self)
+        self.log.debug("WebSocket with id %s closed", self._id)
 
 
 
@@ -62,10 +66,17 @@ class LobbyWebSocket(WebSocketHandler):
     _id: int = -1
     _session: str | None = None
     _custom_id: str | None = None
+    # claims of the verified session token
+    _user: Dict[str, Any] | None = None
+    _token: str | None = None
+    # whether the client wants this connection to become its game connection
+    _upgrade: bool = False
+    # True once the connection was upgraded - it speaks the /reversi protocol from then on
+    _game: bool = False
 
     def __init__(self, *args, **kwargs: Any) -> None:
         self.log = logging.getLogger(self.__class__.__name__)
-        self.event_handler: LobbyEventHandler = LobbyEventHandler(self)
+        self.event_handler: LobbyEventHandler | ReversiEventHandler = LobbyEventHandler(self)
         super().__init__(*args, **kwargs)
 
     def check_origin(self, origin):
@@ -77,33 +88,29 @@ class LobbyWebSocket(WebSocketHandler):
     def open(self):
         self._id = LobbySessionManager.get_ws_id()
         LobbySessionManager.websockets[self._id] = self
-        self.log.debug(f"WebSocket with id {self._id} opened")
+        self.log.debug("WebSocket with id %s opened", self._id)
     
     def on_close(self):
-        self.log.debug(f"Lobby WebSocket with id {self._id} closing")
+        self.log.debug("Lobby WebSocket with id %s closing", self._id)
+        if self._game:
+            GameSessionManager.close_ws(self)
+            return
         if not self._session or not self._id:
             self.log.debug("No session or id")
             return
         self.log.debug("removing session")
-        self.log.debug(LobbySessionManager.sessions[self._session])
+        self.log.debug("%s", LobbySessionManager.sessions.get(self._session))
         try:
             LobbySessionManager.remove_session_ws(self._session, self)
         except Exception:
-            self.log.debug(traceback.format_exc())
-        # emulating a lobby left event
-        self.log.debug("dispatching lobby leave event")
-        event = json.dumps(
-            {
-                "event": "SessionLeaveEvent",
-                "session": self._session,
-                "user_id": self._id,
-            }
-        )
-        task = asyncio.create_task(self.event_handler.dispatch(event))
-        self.log.debug(f"Lobby WebSocket with id {self._id} closed")
+            self.log.debug("removing the websocket failed", exc_info=True)
+        # the other members get it with the next presence update
+        LobbyPresence.left(self._session, self._id)
+        self._session = None
+        self.log.debug("Lobby WebSocket with id %s closed", self._id)
 
     async def on_message(self, message):
-        self.log.debug(f"Lobby Message received from {self._id}: {message}")
+        self.log.debug("Lobby Message received from %s: %s", self._id, message)
         try:
             await self.event_handler.dispatch(message)
         except tornado.websocket.WebSocketClosedError:
@@ -111,6 +118,31 @@ class LobbyWebSocket(WebSocketHandler):
             self.on_close()
 
 
+class MuxWebSocket(WebSocketHandler):
+    """one connection for many game sessions - for bots, spectators and tournament clients"""
+    def __init__(self, *args, **kwargs: Any) -> None:
+        self.log = logging.getLogger(self.__class__.__name__)
+        self.mux = ChannelMux(self)
+        super().__init__(*args, **kwargs)
+
+    def check_origin(self, origin):
+        return True
+
+    def open(self):
+        self.log.debug("Mux WebSocket opened")
+
+    async def on_message(self, message):
+        try:
+            await self.mux.receive(message)
+        except tornado.websocket.WebSocketClosedError:
+            self.log.debug("WebSocketClosedError")
+            self.on_close()
+
+    def on_close(self):
+        self.mux.close()
+        self.log.debug("Mux WebSocket closed")
+
+
 class CreateSessionHandler(RequestHandler):
     BASE_URL = config.public.url
 
@@ -158,18 +190,30 @@ class DiscordLoginHandler(RequestHandler):
 def make_app():
     return tornado.web.Application([
         (r"/reversi", GameWebSocket),
+        (r"/mux", MuxWebSocket),
         (r"/create_session", CreateSessionHandler),
         (r"/lobby", LobbyWebSocket),
         (r"/login", LoginHandler),
-        (r"/register", SignInHandler)
+        (r"/register", SignInHandler),
+        (r"/metrics", MetricsHandler),
+        (r"/health", HealthHandler),
+        (r"/ready", ReadyHandler),
+        (r"/admin/profile", AdminProfileHandler),
+        (r"/admin/tracemalloc", AdminTracemallocHandler),
+        (r"/admin/objects", AdminObjectsHandler),
     ])
 
+log = logging.getLogger(__name__)
+
+
 async def main():
     PORT = 8888
+    setup_logging()
     db = Database()
-    print(db)
+    log.info("%s", db)
     await db.connect()
-    print(f"Starting server on port {PORT}")
+    LoopMonitor().start()
+    log.info("Starting server on port %s", PORT)
     app = make_app()
     app.listen(PORT)
     await asyncio.Event().wait()
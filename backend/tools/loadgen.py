@@ -0,0 +1,354 @@
+"""
+Headless load generator. Simulates pairs of players which go through the
+whole flow of the frontend:
+
+    GET /create_session -> /lobby SessionJoinEvent -> GameStartEvent
+    -> /reversi SessionJoinEvent -> GameReadyEvent -> ChipPlacedEvents until GameOverEvent
+
+With `--upgrade` the lobby connection is upgraded in place and the
+`/reversi` connection and its SessionJoinEvent are skipped.
+
+Every move is a random entry of the `valid_moves` the server sent.
+Reports the round trip latency (p50/p95/p99) per event type, throughput and errors.
+
+Run from `backend/` against a running server:
+    python -m tools.loadgen --players 2000 --ramp 20 --games 3
+
+NOTE:
+-----
+    - thousands of players need as many sockets, raise the limit with `ulimit -n`
+    - the generator is a single event loop - watch its CPU, otherwise it
+      measures itself. Run several processes for more load
+"""
+from typing import *
+import argparse
+import asyncio
+from collections import Counter, defaultdict
+import itertools
+import json
+import random
+import time
+
+from tornado.httpclient import AsyncHTTPClient
+from tornado.websocket import WebSocketClientConnection, websocket_connect
+
+__all__: Final[Sequence[str]] = ["LoadReport", "run_load"]
+
+
+class LoadError(Exception):
+    """a simulated player got an unexpected answer"""
+
+
+class LoadReport:
+    """round trip times and errors per event type"""
+    def __init__(self) -> None:
+        # event type -> round trip times in seconds
+        self.latencies: DefaultDict[str, List[float]] = defaultdict(list)
+        # event type -> error description -> count
+        self.errors: DefaultDict[str, Counter[str]] = defaultdict(Counter)
+        self.messages_sent = 0
+        self.messages_received = 0
+        self.games_finished = 0
+        self.games_failed = 0
+        self.moves = 0
+        self.started = time.monotonic()
+        self.finished: float | None = None
+
+    def record(self, event_type: str, seconds: float) -> None:
+        self.latencies[event_type].append(seconds)
+
+    def error(self, event_type: str, reason: str) -> None:
+        self.errors[event_type][reason] += 1
+
+    @property
+    def duration(self) -> float:
+        return (self.finished or time.monotonic()) - self.started
+
+    @staticmethod
+    def percentile(values: Sequence[float], q: float) -> float:
+        """nearest rank percentile of sorted `values`"""
+        if not values:
+            return 0.0
+        rank = max(0, min(len(values) - 1, int(round(q * len(values))) - 1))
+        return values[rank]
+
+    def summary(self) -> Dict[str, Any]:
+        events: Dict[str, Any] = {}
+        for event_type in sorted(set(self.latencies) | set(self.errors)):
+            values = sorted(self.latencies.get(event_type, []))
+            errors = sum(self.errors[event_type].values()) if event_type in self.errors else 0
+            total = len(values) + errors
+            events[event_type] = {
+                "count": len(values),
+                "errors": errors,
+                "error_rate": errors / total if total else 0.0,
+                "p50_ms": self.percentile(values, 0.50) * 1000,
+                "p95_ms": self.percentile(values, 0.95) * 1000,
+                "p99_ms": self.percentile(values, 0.99) * 1000,
+                "max_ms": (values[-1] if values else 0.0) * 1000,
+            }
+        games = self.games_finished + self.games_failed
+        return {
+            "duration_s": self.duration,
+            "games_finished": self.games_finished,
+            "games_failed": self.games_failed,
+            "game_error_rate": self.games_failed / games if games else 0.0,
+            "moves_per_s": self.moves / self.duration,
+            "messages_sent_per_s": self.messages_sent / self.duration,
+            "messages_received_per_s": self.messages_received / self.duration,
+            "events": events,
+            "error_reasons": {k: dict(v) for k, v in self.errors.items()},
+        }
+
+    def print(self) -> None:
+        summary = self.summary()
+        print(
+            f"{summary['games_finished']} games finished, {summary['games_failed']} failed "
+            f"in {summary['duration_s']:.1f}s ({summary['game_error_rate']:.2%} failed)"
+        )
+        print(
+            f"{summary['moves_per_s']:.1f} moves/s, {summary['messages_sent_per_s']:.1f} messages/s sent, "
+            f"{summary['messages_received_per_s']:.1f} messages/s received"
+        )
+        print(f"{'event':<28}{'count':>8}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+        for event_type, row in summary["events"].items():
+            print(
+                f"{event_type:<28}{row['count']:>8}{row['errors']:>8}{row['p50_ms']:>10.2f}"
+                f"{row['p95_ms']:>10.2f}{row['p99_ms']:>10.2f}{row['max_ms']:>10.2f}"
+            )
+        for event_type, reasons in summary["error_reasons"].items():
+            for reason, count in reasons.items():
+                print(f"  {event_type}: {count}x {reason}")
+
+
+class SimulatedPlayer:
+    """one player with its websocket of the current stage"""
+    def __init__(self, report: LoadReport, base_url: str, custom_id: str, timeout: float, token: str | None):
+        self.report = report
+        self.base_url = base_url
+        self.custom_id = custom_id
+        self.timeout = timeout
+        self.token = token
+        self.ws: WebSocketClientConnection | None = None
+        self.player_id: int | None = None
+
+    async def connect(self, path: str) -> None:
+        self.close()
+        url = self.base_url.replace("http", "ws", 1) + path
+        start = time.monotonic()
+        self.ws = await asyncio.wait_for(websocket_connect(url), self.timeout)
+        self.report.record(f"connect {path}", time.monotonic() - start)
+
+    def close(self) -> None:
+        if self.ws is not None:
+            self.ws.close()
+            self.ws = None
+
+    async def send(self, event: Dict[str, Any]) -> float:
+        """sends `event` and returns the time it was sent"""
+        if self.token is not None:
+            event["token"] = self.token
+        assert self.ws is not None
+        sent = time.monotonic()
+        await self.ws.write_message(json.dumps(event))
+        self.report.messages_sent += 1
+        return sent
+
+    async def receive(self) -> Dict[str, Any]:
+        assert self.ws is not None
+        message = await asyncio.wait_for(self.ws.read_message(), self.timeout)
+        if message is None:
+            raise LoadError("connection closed")
+        self.report.messages_received += 1
+        return json.loads(message)
+
+    async def expect(self, event_type: str, predicate: Callable[[Dict[str, Any]], bool] = lambda e: True) -> Dict[str, Any]:
+        """reads messages until an `event_type` event matches `predicate`. Broadcasts in between are skipped"""
+        while True:
+            event = await self.receive()
+            if event.get("event") == event_type:
+                # errors are only sent to the player who caused them
+                if event.get("status", 200) != 200:
+                    raise LoadError(f"status {event.get('status')}: {event.get('message')}")
+                if predicate(event):
+                    return event
+            if event.get("event") == "RuleErrorEvent":
+                raise LoadError(f"RuleErrorEvent: {event.get('message')}")
+
+    async def request(
+        self,
+        event: Dict[str, Any],
+        answer: str,
+        predicate: Callable[[Dict[str, Any]], bool] = lambda e: True
+    ) -> Dict[str, Any]:
+        """sends `event` and records the time until its `answer` arrived"""
+        sent = await self.send(event)
+        try:
+            response = await self.expect(answer, predicate)
+        except asyncio.TimeoutError:
+            self.report.error(event["event"], "timeout")
+            raise
+        except LoadError as e:
+            self.report.error(event["event"], str(e))
+            raise
+        self.report.record(event["event"], time.monotonic() - sent)
+        return response
+
+    async def play(self, session: str, game_ready: Dict[str, Any], think: float) -> None:
+        """plays random valid moves until the game is over"""
+        my_turn = game_ready["data"]["current_player_id"] == self.player_id
+        valid_moves = game_ready["data"]["current_player_valid_moves"]
+        while True:
+            if my_turn:
+                if think:
+                    await asyncio.sleep(random.uniform(0, 2 * think))
+                move = random.choice(valid_moves)
+                sent = await self.send({
+                    "event": "ChipPlacedEvent",
+                    "session": session,
+                    "user_id": self.player_id,
+                    "data": {"row": move["row"], "column": move["column"]},
+                })
+            result = await self._next_move_result()
+            if my_turn:
+                self.report.record("ChipPlacedEvent", time.monotonic() - sent)
+                self.report.moves += 1
+            game_over = [e for e in result["events"] if e.get("event") == "GameOverEvent"]
+            if game_over:
+                return
+            next_player = [e for e in result["events"] if e.get("event") == "NextPlayerEvent"][0]
+            my_turn = next_player["data"]["user_id"] == self.player_id
+            valid_moves = next_player["data"]["valid_moves"]
+
+    async def _next_move_result(self) -> Dict[str, Any]:
+        while True:
+            event = await self.receive()
+            if "events" in event:
+                return event
+            if event.get("event") == "RuleErrorEvent":
+                self.report.error("ChipPlacedEvent", f"RuleErrorEvent: {event.get('message')}")
+                raise LoadError(event.get("message"))
+            if event.get("event") == "GameOverEvent":
+                # surrender or disconnect of the opponent
+                return {"events": [event]}
+
+
+async def play_match(
+    report: LoadReport,
+    base_url: str,
+    match: int,
+    timeout: float,
+    think: float,
+    token: str | None,
+    upgrade: bool = False,
+) -> None:
+    """two players go from creating the lobby to the end of one game"""
+    players = [
+        SimulatedPlayer(report, base_url, f"load-{match}-{i}", timeout, token)
+        for i in range(2)
+    ]
+    try:
+        start = time.monotonic()
+        response = await AsyncHTTPClient().fetch(f"{base_url}/create_session", request_timeout=timeout)
+        report.record("GET /create_session", time.monotonic() - start)
+        session = json.loads(response.body)["data"]["code"]
+
+        # lobby
+        for player in players:
+            await player.connect("/lobby")
+            await player.request(
+                {"event": "SessionJoinEvent", "session": session, "custom_id": player.custom_id, "upgrade": upgrade},
+                "SessionJoinEvent",
+                lambda e, p=player: e["data"].get("custom_id") == p.custom_id,
+            )
+        await players[0].request({"event": "GameStartEvent", "session": session}, "GameStartEvent")
+        await players[1].expect("GameStartEvent")
+
+        # game
+        if upgrade:
+            start = time.monotonic()
+            game_ready = await players[1].expect("GameReadyEvent")
+            report.record("upgrade", time.monotonic() - start)
+            await players[0].expect("GameReadyEvent")
+        else:
+            for player in players:
+                await player.connect("/reversi")
+            join = {"event": "SessionJoinEvent", "session": session}
+            await players[0].request(
+                {**join, "data": {"custom_id": players[0].custom_id}}, "SessionJoinEvent",
+                lambda e: e["data"].get("custom_id") == players[0].custom_id,
+            )
+            game_ready = await players[1].request(
+                {**join, "data": {"custom_id": players[1].custom_id}}, "GameReadyEvent",
+            )
+            await players[0].expect("GameReadyEvent")
+        for player in players:
+            for key in ("player_1", "player_2"):
+                if game_ready["data"][key]["custom_id"] == player.custom_id:
+                    player.player_id = game_ready["data"][key]["id"]
+        await asyncio.gather(*(player.play(session, game_ready, think) for player in players))
+        report.games_finished += 1
+    except Exception as e:
+        report.games_failed += 1
+        if not isinstance(e, (LoadError, asyncio.TimeoutError)):
+            report.error("match", f"{e.__class__.__name__}: {e}")
+    finally:
+        for player in players:
+            player.close()
+
+
+async def run_load(
+    base_url: str,
+    players: int,
+    games: int = 1,
+    ramp: float = 0.0,
+    timeout: float = 10.0,
+    think: float = 0.0,
+    token: str | None = None,
+    upgrade: bool = False,
+) -> LoadReport:
+    """
+    Runs `players // 2` pairs concurrently, each playing `games` games in a row.
+    The pairs start evenly spread over `ramp` seconds.
+    """
+    AsyncHTTPClient.configure(None, max_clients=max(10, players))
+    report = LoadReport()
+    match_ids = itertools.count()
+    pairs = max(1, players // 2)
+
+    async def pair(index: int) -> None:
+        await asyncio.sleep(ramp * index / pairs)
+        for _ in range(games):
+            await play_match(report, base_url, next(match_ids), timeout, think, token, upgrade)
+
+    await asyncio.gather(*(pair(i) for i in range(pairs)))
+    report.finished = time.monotonic()
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8888", help="base url of the backend")
+    parser.add_argument("--players", type=int, default=100, help="concurrent players, 2 per game")
+    parser.add_argument("--games", type=int, default=1, help="games every pair plays in a row")
+    parser.add_argument("--ramp", type=float, default=5.0, help="seconds over which the pairs start")
+    parser.add_argument("--timeout", type=float, default=10.0, help="seconds to wait for an answer")
+    parser.add_argument("--think", type=float, default=0.0, help="mean seconds a player waits before a move")
+    parser.add_argument("--token", default=None, help="session token sent with every event")
+    parser.add_argument("--upgrade", action="store_true", help="play on the upgraded lobby connection")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    report = asyncio.run(run_load(
+        args.url.rstrip("/"), args.players, args.games, args.ramp, args.timeout, args.think, args.token, args.upgrade
+    ))
+    if args.json:
+        print(json.dumps(report.summary(), indent=2))
+    else:
+        report.print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Perft: counts the leaf positions reachable at depth N with the rules of `Game`.
+The count is a fingerprint of the move generation - any other engine
+(bitboards, NumPy, ...) has to produce the same numbers. The time it takes
+is the move generation speed (nodes/s).
+
+Conventions:
+    - a pass is a ply of its own
+    - a finished game is a leaf, even when it's reached before depth N
+
+Run from `backend/`:
+    python -m tools.perft --depth 6
+    python -m tools.perft --depth 4 --pattern HORIZONTAL --divide
+"""
+from typing import *
+import argparse
+import json
+import sys
+import time
+
+from impl.reversi.game import Game, Board, StartPattern
+
+__all__: Final[Sequence[str]] = ["perft", "divide", "start_position", "KNOWN_COUNTS"]
+
+PATTERNS: Final[Tuple[str, ...]] = ("DIAGONAL", "HORIZONTAL", "VERTICAL")
+# leaf counts of the standard 8x8 start position (DIAGONAL), depth -> nodes
+KNOWN_COUNTS: Final[Dict[str, Dict[int, int]]] = {
+    "DIAGONAL": {1: 4, 2: 12, 3: 56, 4: 244, 5: 1396, 6: 8200, 7: 55092, 8: 390216, 9: 3005288},
+}
+
+GameState = Tuple[List[int | None], int, int, bool, int]
+
+
+def start_position(pattern: str, first_player: int = 1) -> Game:
+    """a new game on the `pattern` start board. `first_player` (1 or 2) moves first"""
+    game = Game(1, 2)
+    # the board generation gives the first chips of the pattern to the current player
+    game._current_player = first_player
+    Board._generate_board(game, 8, 8, start_pattern=getattr(StartPattern, pattern))
+    return game
+
+
+def snapshot(game: Game) -> GameState:
+    board = game.board
+    return (
+        [chip._owner_id for row in board.board for chip in row],
+        game._current_player,
+        board._turn,
+        game.game_over,
+        len(game.turns),
+    )
+
+
+def restore(game: Game, state: GameState) -> None:
+    """undoes everything `Game.place_chip` changed since `snapshot`"""
+    owners, current_player, turn, game_over, turns = state
+    board = game.board
+    i = 0
+    for row in board.board:
+        for chip in row:
+            chip._owner_id = owners[i]
+            i += 1
+    game._current_player = current_player
+    board._turn = turn
+    game.game_over = game_over
+    del game.turns[turns:]
+
+
+def _play(game: Game, row: int, column: int, depth: int) -> int:
+    """plays a move, counts the leaves below it and undoes it"""
+    mover = game.current_player
+    state = snapshot(game)
+    game.place_chip(row, column, mover)
+    try:
+        if game.game_over:
+            return 1
+        if game.current_player == mover:
+            # the opponent has no move and passes
+            return perft(game, depth - 2) if depth > 1 else 1
+        return perft(game, depth - 1)
+    finally:
+        restore(game, state)
+
+
+def perft(game: Game, depth: int) -> int:
+    """the amount of leaf positions `depth` plies below `game`"""
+    if depth == 0:
+        return 1
+    return sum(
+        _play(game, move.row, move.column, depth)
+        for move in game.get_valid_moves(game.current_player)
+    )
+
+
+def divide(game: Game, depth: int) -> Dict[str, int]:
+    """the leaf count below every move of the current player - for finding where two engines differ"""
+    return {
+        move.field_name: _play(game, move.row, move.column, depth)
+        for move in game.get_valid_moves(game.current_player)
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--pattern", choices=PATTERNS, action="append", help="default: all patterns")
+    parser.add_argument("--divide", action="store_true", help="show the count below every first move")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    failed = False
+    results: List[Dict[str, Any]] = []
+    for pattern in args.pattern or PATTERNS:
+        for depth in range(1, args.depth + 1):
+            game = start_position(pattern)
+            start = time.perf_counter()
+            if args.divide and depth == args.depth:
+                moves = divide(game, depth)
+                nodes = sum(moves.values())
+            else:
+                moves = None
+                nodes = perft(game, depth)
+            elapsed = time.perf_counter() - start
+            expected = KNOWN_COUNTS.get(pattern, {}).get(depth)
+            result = {
+                "pattern": pattern,
+                "depth": depth,
+                "nodes": nodes,
+                "seconds": elapsed,
+                "nodes_per_s": nodes / elapsed if elapsed else 0.0,
+                "expected": expected,
+            }
+            if moves is not None:
+                result["divide"] = moves
+            results.append(result)
+            if expected is not None and expected != nodes:
+                failed = True
+            if not args.json:
+                check = "" if expected is None else ("  ok" if expected == nodes else f"  MISMATCH (expected {expected})")
+                print(
+                    f"{pattern:<11} depth {depth:>2}: {nodes:>10} nodes in {elapsed:>8.3f}s "
+                    f"({result['nodes_per_s']:>10.0f} nodes/s){check}"
+                )
+                for field, count in (moves or {}).items():
+                    print(f"    {field}: {count}")
+    if args.json:
+        print(json.dumps(results, indent=2))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
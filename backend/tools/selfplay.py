@@ -0,0 +1,287 @@
+"""
+Self-play: plays complete games with the `Game` engine - no server, no websockets -
+on a process pool and streams them to disk.
+
+Policies:
+    random          a random valid move
+    greedy          the move which flips the most chips
+    search:<depth>  negamax over the chip difference, `depth` plies deep
+
+The first mover of every game is drawn from the seeded rng. The results
+are reported per seat (player 1 / player 2) and per first mover.
+
+Every worker process appends to its own file `<out>/games-<pid>.bin`.
+Read them with `read_games`.
+
+Run from `backend/`:
+    python -m tools.selfplay --games 10000 --workers 8 --policy-1 greedy --policy-2 random
+"""
+from typing import *
+from abc import ABC, abstractmethod
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import os
+import random
+import struct
+import time
+
+from impl.reversi.game import Game, Chip
+from tools.perft import PATTERNS, start_position, snapshot, restore
+
+__all__: Final[Sequence[str]] = [
+    "Policy",
+    "RandomPolicy",
+    "GreedyPolicy",
+    "SearchPolicy",
+    "make_policy",
+    "play_game",
+    "read_games",
+    "GameRecord",
+]
+
+# file layout: FILE_MAGIC, then records of RECORD_HEADER + one byte per move (row * 8 + column)
+FILE_MAGIC: Final[bytes] = b"RVSP\x01"
+# pattern index, first player, winner (0 = draw), chips of player 1, chips of player 2, amount of moves
+RECORD_HEADER: Final[struct.Struct] = struct.Struct("<BBBBBB")
+
+
+class GameRecord(NamedTuple):
+    pattern: str
+    first_player: int
+    winner: int | None
+    chips: Tuple[int, int]
+    moves: List[Tuple[int, int]]
+
+
+class Policy(ABC):
+    """chooses a move out of the valid moves of the current player"""
+    name = "policy"
+
+    @abstractmethod
+    def choose(self, game: Game, moves: List[Chip], rng: random.Random) -> Chip:
+        ...
+
+
+class RandomPolicy(Policy):
+    name = "random"
+
+    def choose(self, game: Game, moves: List[Chip], rng: random.Random) -> Chip:
+        return rng.choice(moves)
+
+
+class GreedyPolicy(Policy):
+    """flips as many chips as possible. Ties are broken randomly"""
+    name = "greedy"
+
+    def choose(self, game: Game, moves: List[Chip], rng: random.Random) -> Chip:
+        player = game.current_player
+        flips = [len(game.board.theoretically_drop_chip(move, player)) for move in moves]
+        best = max(flips)
+        return rng.choice([move for move, count in zip(moves, flips) if count == best])
+
+
+class SearchPolicy(Policy):
+    """negamax with alpha-beta over the chip difference"""
+    def __init__(self, depth: int = 2):
+        self.depth = depth
+        self.name = f"search:{depth}"
+
+    def choose(self, game: Game, moves: List[Chip], rng: random.Random) -> Chip:
+        player = game.current_player
+        best_score = -float("inf")
+        best: List[Chip] = []
+        for move in moves:
+            score = -self._after_move(game, move, player, self.depth - 1, -float("inf"), float("inf"))
+            if score > best_score:
+                best_score, best = score, [move]
+            elif score == best_score:
+                best.append(move)
+        return rng.choice(best)
+
+    def _after_move(self, game: Game, move: Chip, mover: int, depth: int, alpha: float, beta: float) -> float:
+        """plays `move`, returns the score from the view of the opponent of `mover` and undoes it"""
+        state = snapshot(game)
+        game.place_chip(move.row, move.column, mover)
+        try:
+            if game.game_over or depth <= 0:
+                return -self._evaluate(game, mover)
+            if game.current_player == mover:
+                # opponent passed - mover moves again
+                return -self._negamax(game, depth - 1, -beta, -alpha)
+            return self._negamax(game, depth - 1, alpha, beta)
+        finally:
+            restore(game, state)
+
+    def _negamax(self, game: Game, depth: int, alpha: float, beta: float) -> float:
+        player = game.current_player
+        moves = game.get_valid_moves(player)
+        if not moves:
+            return self._evaluate(game, player)
+        best = -float("inf")
+        for move in moves:
+            score = -self._after_move(game, move, player, depth, -beta, -alpha)
+            best = max(best, score)
+            alpha = max(alpha, score)
+            if alpha >= beta:
+                break
+        return best
+
+    @staticmethod
+    def _evaluate(game: Game, player: int) -> float:
+        other = game.player_2 if player == game.player_1 else game.player_1
+        return game.board.count_chips(player) - game.board.count_chips(other)
+
+
+def make_policy(spec: str) -> Policy:
+    """creates a policy from `random`, `greedy` or `search:<depth>`"""
+    name, _, argument = spec.partition(":")
+    if name == "random":
+        return RandomPolicy()
+    if name == "greedy":
+        return GreedyPolicy()
+    if name == "search":
+        return SearchPolicy(int(argument or 2))
+    raise ValueError(f"unknown policy `{spec}`")
+
+
+def play_game(
+    policies: Dict[int, Policy],
+    rng: random.Random,
+    pattern: str | None = None,
+    first_player: int | None = None,
+) -> GameRecord:
+    """
+    plays one game. `policies` maps the player id (1 or 2) to its policy.
+    The pattern and the first player are drawn from `rng` if not given
+    """
+    pattern = pattern or rng.choice(PATTERNS)
+    first_player = first_player or rng.choice((1, 2))
+    game = start_position(pattern, first_player)
+    moves: List[Tuple[int, int]] = []
+    valid_moves = game.get_valid_moves(game.current_player)
+    while not game.game_over:
+        player = game.current_player
+        move = policies[player].choose(game, valid_moves, rng)
+        moves.append((move.row, move.column))
+        events = game.place_chip(move.row, move.column, player)["events"]
+        # place_chip already computed the valid moves of the next player
+        for event in events:
+            if event.get("event") == "NextPlayerEvent":
+                valid_moves = [game.board.get_field(m["row"], m["column"]) for m in event["data"]["valid_moves"]]
+    chips = (game.board.count_chips(1), game.board.count_chips(2))
+    winner = None if chips[0] == chips[1] else (1 if chips[0] > chips[1] else 2)
+    return GameRecord(pattern, first_player, winner, chips, moves)
+
+
+def encode(record: GameRecord) -> bytes:
+    header = RECORD_HEADER.pack(
+        PATTERNS.index(record.pattern),
+        record.first_player,
+        record.winner or 0,
+        record.chips[0],
+        record.chips[1],
+        len(record.moves),
+    )
+    return header + bytes(row * 8 + column for row, column in record.moves)
+
+
+def read_games(path: str) -> Iterator[GameRecord]:
+    """yields the games of a file written by the self-play workers"""
+    with open(path, "rb") as f:
+        data = f.read()
+    if not data.startswith(FILE_MAGIC):
+        raise ValueError(f"{path} is not a self-play file")
+    offset = len(FILE_MAGIC)
+    while offset < len(data):
+        pattern, first_player, winner, chips_1, chips_2, count = RECORD_HEADER.unpack_from(data, offset)
+        offset += RECORD_HEADER.size
+        moves = [divmod(field, 8) for field in data[offset:offset + count]]
+        offset += count
+        yield GameRecord(PATTERNS[pattern], first_player, winner or None, (chips_1, chips_2), moves)
+
+
+def run_chunk(
+    games: int,
+    seed: int,
+    policy_specs: Tuple[str, str],
+    out_dir: str,
+) -> Tuple[int, float, Dict[Tuple[int, int], int]]:
+    """
+    Worker: plays `games` games and appends them to the file of this process.
+
+    Returns:
+    --------
+    `Tuple[int, float, Dict[Tuple[int, int], int]]`
+        played games, seconds of CPU time and the amount of games
+        per (first player, winner) - winner 0 is a draw
+    """
+    rng = random.Random(seed)
+    policies = {1: make_policy(policy_specs[0]), 2: make_policy(policy_specs[1])}
+    path = os.path.join(out_dir, f"games-{os.getpid()}.bin")
+    results = {(first, winner): 0 for first in (1, 2) for winner in (0, 1, 2)}
+    start = time.process_time()
+    new_file = not os.path.exists(path)
+    with open(path, "ab") as f:
+        if new_file:
+            f.write(FILE_MAGIC)
+        for _ in range(games):
+            record = play_game(policies, rng)
+            results[record.first_player, record.winner or 0] += 1
+            f.write(encode(record))
+    return games, time.process_time() - start, results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk", type=int, default=50, help="games per task")
+    parser.add_argument("--policy-1", default="random")
+    parser.add_argument("--policy-2", default="random")
+    parser.add_argument("--out", default="selfplay", help="output directory")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # fail before starting the workers
+    make_policy(args.policy_1), make_policy(args.policy_2)
+    os.makedirs(args.out, exist_ok=True)
+    chunks = [min(args.chunk, args.games - i) for i in range(0, args.games, args.chunk)]
+    done = 0
+    cpu_seconds = 0.0
+    results = {(first, winner): 0 for first in (1, 2) for winner in (0, 1, 2)}
+    start = time.monotonic()
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = [
+            pool.submit(run_chunk, size, args.seed * 1_000_003 + i, (args.policy_1, args.policy_2), args.out)
+            for i, size in enumerate(chunks)
+        ]
+        for future in as_completed(futures):
+            games, seconds, chunk_results = future.result()
+            done += games
+            cpu_seconds += seconds
+            for key, count in chunk_results.items():
+                results[key] += count
+            elapsed = time.monotonic() - start
+            print(
+                f"{done}/{args.games} games, {done / elapsed:.1f} games/s, "
+                f"{games / seconds if seconds else 0.0:.1f} games/s per core",
+                flush=True,
+            )
+    elapsed = time.monotonic() - start
+    print(
+        f"{done} games in {elapsed:.1f}s ({done / elapsed:.1f} games/s, "
+        f"{done / cpu_seconds if cpu_seconds else 0.0:.1f} games/s per core) -> {args.out}"
+    )
+    for player, policy in ((1, args.policy_1), (2, args.policy_2)):
+        other = 3 - player
+        first = sum(results[player, winner] for winner in (0, 1, 2))
+        print(
+            f"player {player} ({policy}): {results[player, player] + results[other, player]} wins - "
+            f"{results[player, player]}/{first} moving first, "
+            f"{results[other, player]}/{done - first} moving second"
+        )
+    print(f"draws: {results[1, 0] + results[2, 0]}")
+
+
+if __name__ == "__main__":
+    main()
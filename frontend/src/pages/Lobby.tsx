@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from "react";
+import React, { useState, useEffect, useRef } from "react";
 import { CopyToClipboard } from "react-copy-to-clipboard";
 import { useNavigate, useParams } from "react-router-dom";
 import { ReactComponent as CopySvg } from "../svg/copy.svg";
@@ -119,6 +119,12 @@ const Lobby: React.FC = () => {
 	const navigate = useNavigate();
 	const [ws, setWs] = useState<WebSocket | null>(null);
 	const [userIds, setUserIds] = useState<Array<number>>([]);
+	// the socket handlers are created once - they read the current members from here
+	const userIdsRef = useRef<Array<number>>([]);
+	const showUserIds = (next: Array<number>) => {
+		userIdsRef.current = next;
+		setUserIds(next);
+	};
 	const [playButtonClicked, setPlayButtonClicked] = useState(false);
 	const { session_id } = useParams<{ session_id: string }>();
 	const [serverMessages, setServerMessages] = useState<Array<string>>([]);
@@ -198,7 +204,7 @@ const Lobby: React.FC = () => {
 					console.log("SessionJoinEvent");
 					const { session } = data;
 					const user_id = data.data.user_id;
-					setUserIds((prevUserIds) => data.data.all_users);
+					showUserIds(data.data.all_users);
 					setJoinedSessionCode(session);
 				} else if (data.status == 404) {
 					// create new session code
@@ -215,7 +221,7 @@ const Lobby: React.FC = () => {
 			if (data.event === "SessionCreateEvent" && data.status === 200) {
 				// setSessionCode(data.session);
 				console.log("SessionCreateEvent");
-				setUserIds([]);
+				showUserIds([]);
 				navigate(`/lobby/${data.session}`);
 				socket.send(
 					JSON.stringify({
@@ -232,9 +238,30 @@ const Lobby: React.FC = () => {
 				navigate(`/game/${data.session}`);
 			}
 
-			// handle session leave event
-			if (data.event === "SessionLeaveEvent" && data.status === 200) {
-				setUserIds((prevUserIds) => data.data.all_users);
+			// handle joins and leaves of other users
+			if (data.event === "PresenceEvent" && data.status === 200) {
+				const left: Array<number> = data.data.left;
+				const next = userIdsRef.current.filter((userId) => !left.includes(userId));
+				for (const userId of data.data.joined as Array<number>) {
+					if (!next.includes(userId)) {
+						next.push(userId);
+					}
+				}
+				showUserIds(next);
+				if (next.length !== data.data.count) {
+					// missed a delta - ask for the full list
+					socket.send(
+						JSON.stringify({
+							event: "PresenceSnapshotEvent",
+							session: data.session,
+						})
+					);
+				}
+			}
+
+			// handle the full member list
+			if (data.event === "PresenceSnapshotEvent" && data.status === 200) {
+				showUserIds(data.data.all_users);
 			}
 
 			// Cleanup WebSocket connection on component unmount